@@ -0,0 +1,332 @@
+# fake_services.py
+"""
+Local stand-ins for the HTTP APIs the poster talks to, for offline load tests.
+
+    FakeTelegram   sendPhoto / sendMessage / getUpdates (long-poll, scripted callbacks) / answerCallbackQuery
+    FakeLinkedIn   userinfo, me, images?action=initializeUpload, upload PUT, ugcPosts
+    FakePexels     /v1/search + image bytes
+    FakeOpenverse  /v1/images/?q=, /v1/images/<id>/ + image bytes
+
+Every fake takes FakeSettings (latency, error injection, rate limit) and exposes
+`.base_url` for the *_API_BASE env overrides in telegram_approval, linkedin_api
+and stock_images. See loadtest.py for the end-to-end driver.
+"""
+import io, re, json, time, random, threading
+from dataclasses import dataclass, field
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, unquote_plus
+from PIL import Image
+
+@dataclass
+class FakeSettings:
+    latency_ms: float = 20.0     # added to every response
+    jitter_ms: float = 10.0
+    error_rate: float = 0.0      # probability of a 500 (Telegram: ok=false)
+    rate_limit: float = 0.0      # requests/second before 429; 0 = unlimited
+    burst: int = 10
+
+@dataclass
+class FakeStats:
+    requests: int = 0
+    errors_injected: int = 0
+    rate_limited: int = 0
+    by_route: dict = field(default_factory=dict)
+
+class _TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate, self.capacity = rate, burst
+        self.tokens = float(burst)
+        self.ts = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.ts) * self.rate)
+            self.ts = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):  # keep load-test output readable
+        pass
+
+    def _dispatch(self, method):
+        fake = self.server.fake
+        n = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(n) if n else b""
+        u = urlparse(self.path)
+        status, headers, payload = fake._handle(method, u.path, parse_qs(u.query), body, self.headers)
+        if isinstance(payload, (dict, list)):
+            payload = json.dumps(payload).encode("utf-8")
+            headers = {"Content-Type": "application/json", **headers}
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):  self._dispatch("GET")
+    def do_POST(self): self._dispatch("POST")
+    def do_PUT(self):  self._dispatch("PUT")
+
+class FakeServer:
+    """Base class: threaded HTTP server on 127.0.0.1 with latency/error/rate-limit injection."""
+    name = "fake"
+
+    def __init__(self, settings=None, port=0):
+        self.settings = settings or FakeSettings()
+        self.stats = FakeStats()
+        self._bucket = _TokenBucket(self.settings.rate_limit, self.settings.burst) if self.settings.rate_limit else None
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.fake = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name=f"{self.name}-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self): return self.start()
+    def __exit__(self, *exc): self.stop()
+
+    # ---------- injection ----------
+
+    def _handle(self, method, path, query, body, headers):
+        with self._lock:
+            self.stats.requests += 1
+            self.stats.by_route[path] = self.stats.by_route.get(path, 0) + 1
+        s = self.settings
+        time.sleep(max(0.0, s.latency_ms + random.uniform(-s.jitter_ms, s.jitter_ms)) / 1000)
+        if self._bucket and not self._bucket.take():
+            with self._lock:
+                self.stats.rate_limited += 1
+            return self.rate_limited()
+        if s.error_rate and random.random() < s.error_rate:
+            with self._lock:
+                self.stats.errors_injected += 1
+            return self.injected_error()
+        return self.route(method, path, query, body, headers)
+
+    def rate_limited(self):
+        return 429, {"Retry-After": "1"}, {"message": "rate limited"}
+
+    def injected_error(self):
+        return 500, {}, {"message": "injected failure"}
+
+    def route(self, method, path, query, body, headers):
+        return 404, {}, {"message": f"no route {method} {path}"}
+
+# ----------------------------- image bytes ------------------------------------
+
+_JPEG_CACHE = {}
+
+def fake_jpeg(w=1280, h=853):
+    """Deterministic gradient JPEG, generated once per size."""
+    if (w, h) not in _JPEG_CACHE:
+        im = Image.linear_gradient("L").resize((w, h)).convert("RGB")
+        buf = io.BytesIO()
+        im.save(buf, "JPEG", quality=85)
+        _JPEG_CACHE[(w, h)] = buf.getvalue()
+    return _JPEG_CACHE[(w, h)]
+
+# ----------------------------- Telegram ---------------------------------------
+
+class FakeTelegram(FakeServer):
+    """
+    Every message with an inline keyboard and "Approval code: XXXX" in its text or
+    caption (a sendPhoto preview, or the keyboard message after an album) schedules
+    a callback update after `react_ms`, taking actions from `script` in order
+    (cycling), e.g. ["ANOTHER", "APPROVE"]. APPROVE taps a random candidate when the
+    keyboard offers several. getUpdates long-polls like the real Bot API.
+    """
+    name = "telegram"
+    CODE_RE = re.compile(rb"Approval code: ([0-9A-Za-z]+)")
+    CHAT_RE = re.compile(rb'name="chat_id"\r\n\r\n(-?\d+)')
+    PICK_RE = re.compile(rb"APPROVE:[0-9A-Za-z]+:(\d+)")
+
+    def __init__(self, chat_id="1000", script=("APPROVE",), react_ms=200, settings=None, port=0):
+        super().__init__(settings, port)
+        self.chat_id = str(chat_id)
+        self.script = list(script) or ["APPROVE"]
+        self.react_ms = react_ms
+        self.updates = []
+        self.sent = []
+        self._next_update = 1
+        self._next_msg = 1
+        self._step = 0
+        self._cond = threading.Condition()
+
+    def injected_error(self):
+        return 500, {}, {"ok": False, "error_code": 500, "description": "injected failure"}
+
+    def rate_limited(self):
+        return 429, {"Retry-After": "1"}, {"ok": False, "error_code": 429,
+                                          "description": "Too Many Requests", "parameters": {"retry_after": 1}}
+
+    def _push_update(self, upd):
+        with self._cond:
+            upd["update_id"] = self._next_update
+            self._next_update += 1
+            self.updates.append(upd)
+            self._cond.notify_all()
+
+    def _chat_of(self, body, form):
+        """The chat the request was sent to (multipart or urlencoded), else the default."""
+        if form.get("chat_id"):
+            return form["chat_id"][0]
+        m = self.CHAT_RE.search(body)
+        return m.group(1).decode() if m else self.chat_id
+
+    def _schedule_callback(self, code, message_id, chat, picks=()):
+        action = self.script[self._step % len(self.script)]
+        self._step += 1
+        if action == "NONE":
+            return
+        data = f"{action}:{code}"
+        if action == "APPROVE" and picks:
+            data += f":{random.choice(picks)}"
+        cb = {"callback_query": {
+            "id": f"cb{message_id}",
+            "data": data,
+            "message": {"message_id": message_id, "chat": {"id": int(chat)}},
+        }}
+        t = threading.Timer(self.react_ms / 1000, self._push_update, args=(cb,))
+        t.daemon = True
+        t.start()
+
+    def route(self, method, path, query, body, headers):
+        m = re.match(r"^/bot[^/]+/(\w+)$", path)
+        if not m:
+            return super().route(method, path, query, body, headers)
+        api = m.group(1)
+        urlencoded = "x-www-form-urlencoded" in (headers.get("Content-Type") or "")
+        form = parse_qs(body.decode("utf-8", "ignore")) if urlencoded else {}
+
+        if api in ("sendPhoto", "sendMessage", "sendMediaGroup"):
+            with self._lock:
+                mid = self._next_msg
+                self._next_msg += 1
+                self.sent.append({"method": api, "message_id": mid, "bytes": len(body)})
+            chat = self._chat_of(body, form)
+            text = unquote_plus(body.decode("utf-8", "ignore")).encode() if urlencoded else body
+            code = self.CODE_RE.search(text)
+            if code and b"reply_markup" in text:
+                picks = [int(k) for k in self.PICK_RE.findall(text)]
+                self._schedule_callback(code.group(1).decode(), mid, chat, picks)
+            msg = {"message_id": mid, "chat": {"id": int(chat)}}
+            return 200, {}, {"ok": True, "result": [msg] if api == "sendMediaGroup" else msg}
+
+        if api == "getUpdates":
+            q = {**query, **form}
+            offset = int((q.get("offset") or ["0"])[0])
+            wait = min(float((q.get("timeout") or ["0"])[0]), 30)
+            deadline = time.monotonic() + wait
+            with self._cond:
+                while True:
+                    pending = [u for u in self.updates if u["update_id"] >= offset]
+                    left = deadline - time.monotonic()
+                    if pending or left <= 0:
+                        break
+                    self._cond.wait(left)
+                if offset:
+                    self.updates = [u for u in self.updates if u["update_id"] >= offset]
+            return 200, {}, {"ok": True, "result": pending}
+
+        if api == "answerCallbackQuery":
+            return 200, {}, {"ok": True, "result": True}
+
+        return 200, {}, {"ok": False, "description": f"unknown method {api}"}
+
+# ----------------------------- LinkedIn ---------------------------------------
+
+class FakeLinkedIn(FakeServer):
+    """
+    Like the real API, ugcPosts has no idempotency key: a repeated POST is a second
+    share. `ghost_rate` is the chance a ugcPosts call creates the share but still
+    answers 500, to exercise the outbox's duplicate check.
+    """
+    name = "linkedin"
+
+    def __init__(self, settings=None, port=0, ghost_rate=0.0):
+        super().__init__(settings, port)
+        self.ghost_rate = ghost_rate
+        self.uploads = {}
+        self.posts = []
+        self._n = 0
+
+    @property
+    def duplicates(self):
+        """Shares beyond the first for the same image."""
+        images = [p["specificContent"]["com.linkedin.ugc.ShareContent"]["media"][0]["media"] for p in self.posts]
+        return len(images) - len(set(images))
+
+    def route(self, method, path, query, body, headers):
+        if path == "/v2/userinfo":
+            return 200, {}, {"sub": "fake-member"}
+        if path == "/v2/me":
+            return 200, {}, {"id": "fake-member"}
+        if path == "/oauth/v2/accessToken":
+            return 200, {}, {"access_token": "fake-token", "expires_in": 3600}
+        if path == "/v2/images" and method == "POST":
+            with self._lock:
+                self._n += 1
+                n = self._n
+            return 200, {}, {"value": {"uploadUrl": f"{self.base_url}/upload/{n}",
+                                       "image": f"urn:li:image:fake{n}"}}
+        if path.startswith("/upload/") and method == "PUT":
+            self.uploads[path.rsplit("/", 1)[1]] = len(body)
+            return 201, {}, b""
+        if path == "/v2/ugcPosts" and method == "POST":
+            with self._lock:
+                self.posts.append(json.loads(body or b"{}"))
+                pid = len(self.posts)
+            if self.ghost_rate and random.random() < self.ghost_rate:
+                return 500, {}, {"message": "internal error (share was created)"}
+            return 201, {"X-RestLi-Id": f"urn:li:share:{pid}"}, {"id": f"urn:li:share:{pid}"}
+        if path == "/v2/ugcPosts" and method == "GET":
+            with self._lock:
+                recent = [{"id": f"urn:li:share:{i}", **p} for i, p in enumerate(self.posts, 1)][::-1]
+            return 200, {}, {"elements": recent[:int((query.get("count") or ["20"])[0])]}
+        return super().route(method, path, query, body, headers)
+
+# ----------------------------- stock providers --------------------------------
+
+class FakePexels(FakeServer):
+    name = "pexels"
+
+    def route(self, method, path, query, body, headers):
+        if path == "/v1/search":
+            photos = [{"id": i, "src": {"large": f"{self.base_url}/img/{i}.jpg"}} for i in range(1, 11)]
+            return 200, {}, {"photos": photos}
+        if path.startswith("/img/"):
+            return 200, {"Content-Type": "image/jpeg"}, fake_jpeg()
+        return super().route(method, path, query, body, headers)
+
+class FakeOpenverse(FakeServer):
+    name = "openverse"
+
+    def route(self, method, path, query, body, headers):
+        if path == "/v1/images/":
+            return 200, {}, {"results": [{"id": f"ov{i}"} for i in range(1, 11)]}
+        m = re.match(r"^/v1/images/([\w-]+)/$", path)
+        if m:
+            return 200, {}, {"id": m.group(1), "url": f"{self.base_url}/img/{m.group(1)}.jpg"}
+        if path.startswith("/img/"):
+            return 200, {"Content-Type": "image/jpeg"}, fake_jpeg(1200, 900)
+        return super().route(method, path, query, body, headers)
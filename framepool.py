@@ -0,0 +1,139 @@
+# framepool.py
+"""
+Reusable full-size frame buffers for the procedural renderer, with an RSS budget.
+
+    with FRAMES.frame((1600, 900)) as bg:   # RGBA, contents undefined: paint every pixel
+        ...
+        return bg.convert("RGB")            # only the final output escapes the pool
+
+A released frame goes back on a small free list, so back-to-back renders reuse
+it instead of allocating. With `max_rss` set (bytes), acquiring a *new* buffer
+that would push the process over budget first drops free buffers, then waits
+for other renders in this process to release theirs, and finally raises
+RenderBudgetExceeded. Renders in one process can therefore run in parallel
+without going over the limit. A render is a thread: frames the caller already
+holds (e.g. the shared background while it cuts per-format frames) never make
+it wait for itself.
+"""
+import os, time, threading
+from contextlib import contextmanager
+from PIL import Image
+
+BANDS = {"RGBA": 4, "RGB": 3, "L": 1}
+
+class RenderBudgetExceeded(MemoryError):
+    pass
+
+def current_rss():
+    """Resident set size in bytes (Linux /proc; 0 when unknown)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        return 0
+
+class FramePool:
+    def __init__(self, max_rss=None, max_free=4, wait_seconds=30):
+        self.max_rss = max_rss
+        self.max_free = max_free
+        self.wait_seconds = wait_seconds
+        self._free = {}          # (mode, size) -> [Image]
+        self._in_use = 0
+        self._held = {}          # thread ident -> frames it has checked out
+        self._live = {}          # thread ident -> bytes of those frames
+        self._peak = {}          # thread ident -> peak of _live since its reset_peak()
+        self._cond = threading.Condition()
+        self.allocations = 0
+        self.reuses = 0
+        self.live_bytes = 0      # bytes held by frames currently checked out, all threads
+
+    @staticmethod
+    def nbytes(size, mode="RGBA"):
+        return size[0] * size[1] * BANDS.get(mode, 4)
+
+    def _free_bytes(self):
+        # caller holds _cond
+        return sum(self.nbytes(im.size, im.mode) for lst in self._free.values() for im in lst)
+
+    def _trim(self):
+        self._free.clear()
+
+    def acquire(self, size, mode="RGBA"):
+        key = (mode, tuple(size))
+        need = self.nbytes(size, mode)
+        with self._cond:
+            lst = self._free.get(key)
+            if lst:
+                im = lst.pop()
+                self.reuses += 1
+            else:
+                im = None
+                if self.max_rss:
+                    deadline = time.monotonic() + self.wait_seconds
+                    while current_rss() + need > self.max_rss:
+                        if self._free:
+                            self._trim()
+                            continue
+                        left = deadline - time.monotonic()
+                        others = self._in_use - self._held.get(threading.get_ident(), 0)
+                        if others == 0 or left <= 0:
+                            raise RenderBudgetExceeded(
+                                f"frame {size} {mode} needs {need >> 20} MB; "
+                                f"rss {current_rss() >> 20} MB, budget {self.max_rss >> 20} MB")
+                        self._cond.wait(left)
+            self._in_use += 1
+            me = threading.get_ident()
+            self._held[me] = self._held.get(me, 0) + 1
+            self._live[me] = self._live.get(me, 0) + need
+            self._peak[me] = max(self._peak.get(me, 0), self._live[me])
+            self.live_bytes += need
+        if im is None:
+            im = Image.new(mode, size)
+            self.allocations += 1
+        return im
+
+    def release(self, im):
+        with self._cond:
+            self._in_use -= 1
+            me = threading.get_ident()
+            nbytes = self.nbytes(im.size, im.mode)
+            if self._held.get(me, 0) > 1:
+                self._held[me] -= 1
+                self._live[me] -= nbytes
+            else:
+                self._held.pop(me, None)
+                self._live.pop(me, None)
+            self.live_bytes -= nbytes
+            lst = self._free.setdefault((im.mode, im.size), [])
+            if len(lst) < self.max_free:
+                lst.append(im)
+            self._cond.notify_all()
+
+    @contextmanager
+    def frame(self, size, mode="RGBA"):
+        im = self.acquire(size, mode)
+        try:
+            yield im
+        finally:
+            self.release(im)
+
+    def reset_peak(self):
+        """Start measuring the calling thread's render (see stats)."""
+        with self._cond:
+            alive = {t.ident for t in threading.enumerate()}
+            self._peak = {k: v for k, v in self._peak.items() if k in alive}
+            me = threading.get_ident()
+            self._peak[me] = self._live.get(me, 0)
+
+    def stats(self):
+        """
+        peak_frame_bytes is the calling thread's own render since reset_peak();
+        the pool_* counters are process-wide (every render that shares this pool).
+        """
+        with self._cond:
+            return {
+                "peak_frame_bytes": self._peak.get(threading.get_ident(), 0),
+                "pool_allocations": self.allocations,
+                "pool_reuses": self.reuses,
+                "pool_free_bytes": self._free_bytes(),
+            }
@@ -1,9 +1,16 @@
-import os, random, json, csv, datetime, pytz, math
-from PIL import Image, ImageDraw, ImageFont, ImageFilter
+import os, random, json, csv, datetime, pytz, math, threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from PIL import Image, ImageDraw, ImageFilter, ImageColor
 import yaml
 
 # NEW: stock photos (Pexels/Openverse) with free fallbacks
-from stock_images import try_pexels, try_openverse
+from stock_images import fetch_stock, decode_crop
+from tracing import span, attach, current_run, NULL_SPAN
+import http_pool
+import sprites
+from framepool import FramePool, current_rss
+from image_stats import ImageStats
 
 ROOT = os.path.dirname(__file__)
 OUT = os.path.join(ROOT, "out")
@@ -11,30 +18,36 @@ LOG_CSV = os.path.join(ROOT, "content_log.csv")
 LOG_MD  = os.path.join(ROOT, "content_log.md")
 CONFIG = yaml.safe_load(open(os.path.join(ROOT, "config.yaml"), "r", encoding="utf-8"))
 
+# Full-size RGBA frames are reused across renders; render_image applies render.max_rss_mb
+FRAMES = FramePool()
+
 # ----------------------------- helpers ---------------------------------------
 
 def ensure_dirs():
     os.makedirs(OUT, exist_ok=True)
 
-def pick_palette():
-    return random.choice(CONFIG["brand"]["palette_choices"])
+def pick_palette(config=None):
+    return random.choice((config or CONFIG)["brand"]["palette_choices"])
 
-def rand_emoji():
-    pool = CONFIG["style"]["emoji_pool"]
-    return random.choice(pool) if CONFIG["style"]["allow_emojis"] else ""
+def rand_emoji(config=None):
+    style = (config or CONFIG)["style"]
+    return random.choice(style["emoji_pool"]) if style["allow_emojis"] else ""
 
-def pick_topic():
-    return random.choice(CONFIG["topics"])
+def pick_topic(config=None):
+    return random.choice((config or CONFIG)["topics"])
 
 def load_font(size, bold=False):
-    path = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf" if bold \
-        else "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
-    try:
-        return ImageFont.truetype(path, size)
-    except Exception:
-        return ImageFont.load_default()
-
-def gradient_bg(w, h, c1, c2):
+    return sprites.font(size, bold)
+
+def gradient_bg(w, h, c1, c2, out=None):
+    """Vertical c1→c2 gradient. With `out` (an RGBA frame) it is painted in place, row by row."""
+    if out is not None:
+        a, b = ImageColor.getrgb(c1)[:3], ImageColor.getrgb(c2)[:3]
+        d = ImageDraw.Draw(out)
+        for y in range(h):
+            m = int(255 * (1 - y / max(1, h-1)))
+            d.line((0, y, w, y), fill=tuple((a[i]*m + b[i]*(255-m) + 127) // 255 for i in range(3)) + (255,))
+        return out
     base = Image.new("RGB", (w, h), c2)
     top  = Image.new("RGB", (w, h), c1)
     mask = Image.new("L", (w, h))
@@ -57,14 +70,15 @@ def text_wrap(draw, text, font, max_width):
 
 # ----------------------------- persona-guided copy ----------------------------
 
-def persona_caption(topic: str) -> str:
-    p = CONFIG.get("persona", {})
+def persona_caption(topic: str, config=None) -> str:
+    cfg = config or CONFIG
+    p = cfg.get("persona", {})
     traits  = p.get("traits", [])
     anchors = p.get("anchors", [])
     humor   = int(p.get("humor", 1))
     depth   = int(p.get("depth", 2))
 
-    humor_openers = ["", f"{rand_emoji()} Tiny win:", f"{rand_emoji()} Quick flex:"]
+    humor_openers = ["", f"{rand_emoji(cfg)} Tiny win:", f"{rand_emoji(cfg)} Quick flex:"]
     opener = humor_openers[min(max(humor,0),2)]
 
     if depth == 1:
@@ -89,53 +103,86 @@ def persona_caption(topic: str) -> str:
     if depth >= 3 and anchor:  lines.append(f"Focus lately: {anchor}.")
 
     body = "\n".join([ln for ln in lines if ln])
-    tags = " ".join(CONFIG["brand"]["hashtags"])
-    sig  = CONFIG["brand"]["signature_text"]
+    tags = " ".join(cfg["brand"]["hashtags"])
+    sig  = cfg["brand"]["signature_text"]
     return f"{body}\n\n{tags}\n\n{sig}"
 
 # ----------------------------- signature overlay -----------------------------
 
-def add_signature_only(img: Image.Image, signature: str) -> Image.Image:
-    """Put only a small signature in bottom-right of a photo or canvas."""
-    d = ImageDraw.Draw(img)
-    font = load_font(28)
-    pad = 24
-    tw = d.textlength(signature, font=font)
-    th = 34
+def add_signature_only(img: Image.Image, signature: str, stats=None) -> Image.Image:
+    """
+    Put only a small signature in the calmest corner of a photo or canvas
+    (lowest luminance variance; bottom-right when nothing is calmer).
+    """
+    pad, th = 24, 34
+    # soft plate behind text for contrast (pre-rasterized, real alpha)
+    sprite = sprites.plate_sprite(signature, size=28, pad=pad, height=th)
     w, h = img.size
-    # soft plate behind text for contrast
-    d.rectangle([w - tw - pad*2, h - th - pad, w - pad, h - pad], fill=(0,0,0,120))
-    d.text((w - tw - pad*1.5, h - th - pad*1.2), signature, fill=(255,255,255), font=font)
-    return img
+    sw, sh = sprite.size
+    right, bottom = int(round(w - sprite.advance - pad*2)), h - th - pad
+    corners = [(right, bottom), (pad, bottom), (right, pad), (pad, pad)]
+    stats = stats or ImageStats(img)
+    x, y, _, _ = stats.quietest([(x, y, x + sw, y + sh) for x, y in corners])
+    return sprites.stamp(img, sprite, (x, y))
 
 # ----------------------------- procedural visuals (fallback) ------------------
 
-def draw_card(canvas, title, sub, signature):
-    w, h = canvas.size
-    card = Image.new("RGBA", (w-220, h-280), (255,255,255,238))
-    shadow = Image.new("RGBA", (card.size[0]+40, card.size[1]+40), (0,0,0,0))
+# Output formats; render.formats picks which to produce (the first one is the post image)
+FORMATS = {
+    "landscape": (1600, 900),
+    "square":    (1080, 1080),
+    "portrait":  (1080, 1350),
+}
+
+@lru_cache(maxsize=8)
+def _card_template(size):
+    card = Image.new("RGBA", size, (255,255,255,238))
+    ImageDraw.Draw(card).rounded_rectangle([0,0,size[0]-1,size[1]-1], radius=28, fill=(255,255,255,245))
+    return card
+
+@lru_cache(maxsize=8)
+def _card_shadow(size):
+    shadow = Image.new("RGBA", (size[0]+40, size[1]+40), (0,0,0,0))
     sd = ImageDraw.Draw(shadow)
     sd.rounded_rectangle([0,0,shadow.size[0]-1,shadow.size[1]-1], radius=28, fill=(0,0,0,85))
-    shadow = shadow.filter(ImageFilter.GaussianBlur(16))
-    canvas.alpha_composite(shadow, (110-16,110-16))
+    return shadow.filter(ImageFilter.GaussianBlur(16))
+
+def card_box(size):
+    """(x, y, w, h) of the card on a canvas: 110px side margins, at most 4:3, centered above the signature strip."""
+    w, h = size
+    cw = w - 220
+    ch = min(h - 280, cw * 3 // 4)
+    return 110, (h - ch - 60) // 2, cw, ch
+
+BADGE_R = 46
+
+def draw_card(canvas, title, sub, signature, badge=False):
+    """The title card for `canvas`; `badge` adds the avatar top-right and keeps the title clear of it."""
+    x, y, cw, ch = card_box(canvas.size)
+    size = (cw, ch)
+    # card body and its blurred shadow never change for a given size: built once, reused
+    canvas.alpha_composite(_card_shadow(size), (x-16,y-16))
+    card = _card_template(size).copy()
     cd = ImageDraw.Draw(card)
-    cd.rounded_rectangle([0,0,card.size[0]-1,card.size[1]-1], radius=28, fill=(255,255,255,245))
 
     title_font = load_font(56, bold=True)
-    sub_font   = load_font(34)
-    wrap = text_wrap(cd, title, title_font, card.size[0]-80)
+    badge_x = card.size[0] - 120
+    # title runs from x=40 to the badge's left edge (minus a gap) when there is one
+    title_w = badge_x - BADGE_R - 24 - 40 if badge else card.size[0] - 80
+    wrap = text_wrap(cd, title, title_font, title_w)
     y = 44
     for line in wrap:
         cd.text((40,y), line, fill=(22,27,34), font=title_font)
         y += 62
-    cd.text((40,y+6), sub, fill=(70,84,98), font=sub_font)
+    sprites.stamp(card, sprites.text_sprite(sub, 34, (70,84,98)), (40, y+6))
 
-    sig_font = load_font(28)
-    tw = cd.textlength(signature, font=sig_font)
-    cd.text((card.size[0]-tw-40, card.size[1]-52), signature, fill=(60,72,88), font=sig_font)
+    sig = sprites.text_sprite(signature, 28, (60,72,88))
+    sprites.stamp(card, sig, (card.size[0]-sig.advance-40, card.size[1]-52))
+    if badge:
+        avatar_badge(card, badge_x, 120)
     return card
 
-def avatar_badge(card, x, y, r=46):
+def avatar_badge(card, x, y, r=BADGE_R):
     d = ImageDraw.Draw(card)
     d.ellipse([x-r, y-r, x+r, y+r], fill=(255,255,255,235))
     d.ellipse([x-r+10, y-r+10, x+r-10, y+r-10], fill=(245,208,170,255))
@@ -143,168 +190,305 @@ def avatar_badge(card, x, y, r=46):
     d.ellipse([x-12, y-5, x-4, y+3], fill=(40,40,40,255))
     d.ellipse([x+4,  y-5, x+12, y+3], fill=(40,40,40,255))
 
-def style_cartoon_card(topic, palette):
-    w, h = 1600, 900
-    bg = gradient_bg(w, h, palette[0], palette[1]).convert("RGBA")
+# Each style is a background painter plus card options. The background (gradient +
+# texture) is painted once into a pooled RGBA frame covering every requested format;
+# each format then gets a centered crop of it, its own card layout and frame border.
+
+def bg_cartoon_card(bg, palette):
+    w, h = bg.size
+    gradient_bg(w, h, palette[0], palette[1], out=bg)
     d = ImageDraw.Draw(bg)
     for _ in range(14):
         x0 = random.randint(-100, w); y0 = random.randint(-60, h)
         x1 = x0 + random.randint(60, 180); y1 = y0 + random.randint(30, 120)
         d.rounded_rectangle([x0,y0,x1,y1], radius=18, outline=(255,255,255,30), width=2)
-    card = draw_card(bg, topic, "Building, learning, iterating — every week.", CONFIG["brand"]["signature_text"])
-    avatar_badge(card, card.size[0]-120, 120)
-    bg.alpha_composite(card, (110,110))
-    return bg.convert("RGB")
-
-def style_futuristic_glow(topic, palette):
-    w, h = 1600, 900
-    bg = gradient_bg(w, h, palette[0], palette[1]).convert("RGBA")
+
+def bg_futuristic_glow(bg, palette):
+    w, h = bg.size
+    gradient_bg(w, h, palette[0], palette[1], out=bg)
     d = ImageDraw.Draw(bg)
+    rings = []
     for _ in range(12):
         cx, cy = random.randint(0,w), random.randint(0,h)
         r = random.randint(70, 220)
         d.ellipse([cx-r, cy-r, cx+r, cy+r], outline=(255,255,255,28), width=2)
-    blur = bg.filter(ImageFilter.GaussianBlur(6))
-    bg = Image.alpha_composite(blur, bg)
-    card = draw_card(bg, topic, "Clean architecture and real-world speed.", CONFIG["brand"]["signature_text"])
-    bg.alpha_composite(card, (110,110))
-    return bg.convert("RGB")
-
-def style_lineart_grid(topic, palette):
-    w, h = 1600, 900
-    bg = gradient_bg(w, h, palette[0], palette[1]).convert("RGBA")
+        rings.append((cx, cy, r))
+    # glow: only the ring pixels are translucent, so blur around the rings instead of
+    # a full-frame copy. Overlapping ring boxes (margin > blur support) are merged
+    # first: blurring them one after another would blur already-glowed pixels again.
+    boxes = []
+    for cx, cy, r in rings:
+        m = r + 24
+        box = [max(0, cx-m), max(0, cy-m), min(w, cx+m), min(h, cy+m)]
+        if box[0] >= box[2] or box[1] >= box[3]:
+            continue
+        merged = True
+        while merged:
+            merged = False
+            for other in boxes:
+                if box[0] < other[2] and other[0] < box[2] and box[1] < other[3] and other[1] < box[3]:
+                    boxes.remove(other)
+                    box = [min(box[0], other[0]), min(box[1], other[1]), max(box[2], other[2]), max(box[3], other[3])]
+                    merged = True
+                    break
+        boxes.append(box)
+    for box in boxes:
+        region = bg.crop(tuple(box))
+        bg.paste(Image.alpha_composite(region.filter(ImageFilter.GaussianBlur(6)), region), tuple(box[:2]))
+
+def bg_lineart_grid(bg, palette):
+    w, h = bg.size
+    gradient_bg(w, h, palette[0], palette[1], out=bg)
     d = ImageDraw.Draw(bg)
     step = 32
     for x in range(0, w, step): d.line([(x,0),(x,h)], fill=(255,255,255,28), width=1)
     for y in range(0, h, step): d.line([(0,y),(w,y)], fill=(255,255,255,18), width=1)
-    card = draw_card(bg, topic, "Fast feedback loops from idea to polish.", CONFIG["brand"]["signature_text"])
-    avatar_badge(card, card.size[0]-120, 120)
-    bg.alpha_composite(card, (110,110))
-    return bg.convert("RGB")
-
-def style_blueprint(topic, palette):
-    w, h = 1600, 900
-    blue = "#0a4aa3"
-    bg = Image.new("RGB", (w,h), blue).convert("RGBA")
+
+def bg_blueprint(bg, palette):
+    w, h = bg.size
+    bg.paste(ImageColor.getrgb("#0a4aa3") + (255,), (0, 0, w, h))
     d = ImageDraw.Draw(bg)
     for x in range(0, w, 40): d.line([(x,0),(x,h)], fill=(255,255,255,35))
     for y in range(0, h, 40): d.line([(0,y),(w,y)], fill=(255,255,255,35))
-    d.rectangle([20,20,w-20,h-20], outline=(255,255,255,170), width=4)
-    card = draw_card(bg, topic, "Blueprinting great mobile experiences.", CONFIG["brand"]["signature_text"])
-    bg.alpha_composite(card, (110,110))
-    return bg.convert("RGB")
-
-def style_retro_halftone(topic, palette):
-    w, h = 1600, 900
-    bg = gradient_bg(w, h, palette[0], palette[1]).convert("RGBA")
-    dots = Image.new("RGBA", (w,h), (0,0,0,0))
-    dd = ImageDraw.Draw(dots)
+
+def border_blueprint(frame):
+    w, h = frame.size
+    ImageDraw.Draw(frame).rectangle([20,20,w-20,h-20], outline=(255,255,255,170), width=4)
+
+def bg_retro_halftone(bg, palette):
+    w, h = bg.size
+    gradient_bg(w, h, palette[0], palette[1], out=bg)
+    # one dot row at a time through a small reusable mask strip instead of a
+    # full-frame dots layer (dots span at most ±7px around their row)
     step = 24
+    strip = Image.new("L", (w, step))
+    sd = ImageDraw.Draw(strip)
     for y in range(0,h,step):
+        sd.rectangle([0, 0, w, step], fill=0)
         for x in range(0,w,step):
             r = int(4 + 3*math.sin(x*0.015) * math.cos(y*0.02))
-            dd.ellipse([x-r,y-r,x+r,y+r], fill=(0,0,0,20))
-    bg.alpha_composite(dots)
-    card = draw_card(bg, topic, "Retro vibes, modern performance.", CONFIG["brand"]["signature_text"])
-    bg.alpha_composite(card, (110,110))
-    return bg.convert("RGB")
-
-def style_neon_wave(topic, palette):
-    w, h = 1600, 900
-    bg = gradient_bg(w, h, palette[0], "#0b1021").convert("RGBA")
+            sd.ellipse([x-r,step//2-r,x+r,step//2+r], fill=20)
+        bg.paste((0,0,0,255), (0, y - step//2), strip)
+
+def bg_neon_wave(bg, palette):
+    w, h = bg.size
+    gradient_bg(w, h, palette[0], "#0b1021", out=bg)
     d = ImageDraw.Draw(bg)
     for k in range(8):
         a = random.uniform(20, 90); f = random.uniform(0.008, 0.02); y0 = random.randint(0, h)
         path = [(x, int(y0 + a * math.sin(f*x + k))) for x in range(0, w, 8)]
         d.line(path, fill=(255,255,255,40), width=3)
-    card = draw_card(bg, topic, "Neon clarity for complex problems.", CONFIG["brand"]["signature_text"])
-    avatar_badge(card, card.size[0]-120, 120)
-    bg.alpha_composite(card, (110,110))
-    return bg.convert("RGB")
-
-def style_isometric_cubes(topic, palette):
-    w, h = 1600, 900
-    bg = gradient_bg(w, h, palette[0], palette[1]).convert("RGBA")
+
+def bg_isometric_cubes(bg, palette):
+    w, h = bg.size
+    gradient_bg(w, h, palette[0], palette[1], out=bg)
     d = ImageDraw.Draw(bg)
     for _ in range(60):
         cx, cy = random.randint(-80,w+80), random.randint(-80,h+80)
         size = random.randint(14, 32)
         top = [(cx,cy-size),(cx+size,cy),(cx,cy+size),(cx-size,cy)]
         d.polygon(top, outline=(255,255,255,40))
-    card = draw_card(bg, topic, "Systems that scale without the bloat.", CONFIG["brand"]["signature_text"])
-    bg.alpha_composite(card, (110,110))
-    return bg.convert("RGB")
 
-def style_anime_pastel(topic, palette):
-    w, h = 1600, 900
+def _pastel_blob(rx, ry):
+    # not cached: the radii are random, so a cache only pins MBs outside the frame budget
+    blob = Image.new("RGBA", (rx*2, ry*2), (0,0,0,0))
+    ImageDraw.Draw(blob).ellipse([0,0,rx*2,ry*2], fill=(255,255,255,80))
+    return blob.filter(ImageFilter.GaussianBlur(18))
+
+def bg_anime_pastel(bg, palette):
+    w, h = bg.size
     pastel = ["#ffd6e7","#d6f0ff","#e6ffd6","#fff1cc","#e6e0ff"]
     c1, c2 = random.choice(pastel), random.choice(pastel)
-    bg = gradient_bg(w, h, c1, c2).convert("RGBA")
-    d = ImageDraw.Draw(bg)
+    gradient_bg(w, h, c1, c2, out=bg)
     for _ in range(12):
         rx, ry = random.randint(80, 260), random.randint(60, 180)
         x, y = random.randint(-100,w), random.randint(-80,h)
-        blob = Image.new("RGBA", (rx*2, ry*2), (0,0,0,0))
-        bd = ImageDraw.Draw(blob)
-        bd.ellipse([0,0,rx*2,ry*2], fill=(255,255,255,80))
-        blob = blob.filter(ImageFilter.GaussianBlur(18))
-        bg.alpha_composite(blob, (x-rx, y-ry))
-    # badge + card, still no text in the photo area other than signature
-    card = draw_card(bg, topic, "Soft look, sharp craft.", CONFIG["brand"]["signature_text"])
-    bg.alpha_composite(card, (110,110))
-    return bg.convert("RGB")
+        blob = _pastel_blob(rx, ry)
+        # alpha_composite needs a non-negative dest: clip the blob instead
+        sx, sy = max(0, rx-x), max(0, ry-y)
+        if sx < blob.size[0] and sy < blob.size[1]:
+            bg.alpha_composite(blob, (max(0, x-rx), max(0, y-ry)), (sx, sy))
 
+# name: (background painter, card subtitle, avatar badge, per-format border)
 STYLE_VARIANTS = {
-    "cartoon_card":     style_cartoon_card,
-    "futuristic_glow":  style_futuristic_glow,
-    "lineart_grid":     style_lineart_grid,
-    "blueprint":        style_blueprint,
-    "retro_halftone":   style_retro_halftone,
-    "neon_wave":        style_neon_wave,
-    "isometric_cubes":  style_isometric_cubes,
-    "anime_pastel":     style_anime_pastel,
+    "cartoon_card":     (bg_cartoon_card,    "Building, learning, iterating — every week.", True,  None),
+    "futuristic_glow":  (bg_futuristic_glow, "Clean architecture and real-world speed.",    False, None),
+    "lineart_grid":     (bg_lineart_grid,    "Fast feedback loops from idea to polish.",    True,  None),
+    "blueprint":        (bg_blueprint,       "Blueprinting great mobile experiences.",      False, border_blueprint),
+    "retro_halftone":   (bg_retro_halftone,  "Retro vibes, modern performance.",            False, None),
+    "neon_wave":        (bg_neon_wave,       "Neon clarity for complex problems.",          True,  None),
+    "isometric_cubes":  (bg_isometric_cubes, "Systems that scale without the bloat.",       False, None),
+    "anime_pastel":     (bg_anime_pastel,    "Soft look, sharp craft.",                     False, None),
 }
 
+def render_style(name, topic, palette, sizes=((1600, 900),), signature=None):
+    """
+    One style at several sizes from a single background pass. Returns {size: RGB image}.
+    `signature` goes on the card (default: the module config's brand signature).
+    """
+    signature = signature or CONFIG["brand"]["signature_text"]
+    paint, sub, avatar, border = STYLE_VARIANTS[name]
+    extent = (max(s[0] for s in sizes), max(s[1] for s in sizes))
+    out = {}
+    with FRAMES.frame(extent) as bg:
+        paint(bg, palette)
+        for size in sizes:
+            with FRAMES.frame(size) as frame:
+                # centered crop of the shared background (paste clips to the frame)
+                frame.paste(bg, (-((extent[0] - size[0]) // 2), -((extent[1] - size[1]) // 2)))
+                if border:
+                    border(frame)
+                card = draw_card(frame, topic, sub, signature, badge=avatar)
+                frame.alpha_composite(card, card_box(size)[:2])
+                out[size] = frame.convert("RGB")
+    return out
+
+def build_images(topic, palette, sizes, name=None, signature=None):
+    name = name or random.choice(list(STYLE_VARIANTS.keys()))
+    return render_style(name, topic, palette, sizes, signature), name
+
 def build_image(topic, palette):
-    name = random.choice(list(STYLE_VARIANTS.keys()))
-    img  = STYLE_VARIANTS[name](topic, palette)
-    return img, name
+    imgs, name = build_images(topic, palette, [FORMATS["landscape"]])
+    return imgs[FORMATS["landscape"]], name
 
 # ----------------------------- pipeline ---------------------------------------
 
-def build():
+def output_formats(config=None):
+    formats = ((config or CONFIG).get("render") or {}).get("formats") or ["landscape"]
+    unknown = [f for f in formats if f not in FORMATS]
+    if unknown:
+        raise ValueError(f"unknown render.formats {unknown}; choose from {list(FORMATS)}")
+    return list(formats)
+
+def plan_post(config=None, tag="", topic=None):
+    """Topic, caption and output paths. `tag` keeps file names unique per account."""
+    cfg = config or CONFIG
     ensure_dirs()
-    topic = pick_topic()
-    text  = persona_caption(topic)  # persona-guided copy (free)
+    topic = topic or pick_topic(cfg)
+    text  = persona_caption(topic, cfg)  # persona-guided copy (free)
 
-    # file naming early (so stock fetchers can write directly)
+    # file naming early
     now = datetime.datetime.now(pytz.timezone("Asia/Jerusalem"))
     stamp = now.strftime("%Y%m%d_%H%M%S")
-    img_path = os.path.join(OUT, f"post_{stamp}.jpg")
-    txt_path = os.path.join(OUT, f"post_{stamp}.txt")
-
-    # 1) Try stock photos (Pexels → Openverse)
-    got_stock = try_pexels(topic, img_path) or try_openverse(topic, img_path)
-    style_name = "stock:pexels" if got_stock else ""
-
-    if got_stock:
-        # open, add small signature, save
-        img = Image.open(img_path).convert("RGB")
-        img = add_signature_only(img, CONFIG["brand"]["signature_text"])
-        img.save(img_path, quality=95, subsampling=0)
+    prefix = f"post_{tag}_" if tag else "post_"
+    # the first format is the post image; the others get a _<format> suffix
+    formats = output_formats(cfg)
+    variants = {fmt: os.path.join(OUT, f"{prefix}{stamp}{'_' + fmt if i else ''}.jpg")
+                for i, fmt in enumerate(formats)}
+    return {
+        "image": variants[formats[0]],
+        "variants": variants,
+        "txt": os.path.join(OUT, f"{prefix}{stamp}.txt"),
+        "text": text, "topic": topic, "stamp": stamp,
+    }
+
+def render_image(meta, provider, config=None, photo=None):
+    """
+    CPU half of build(): decode and crop the downloaded stock `photo` (bytes) to every
+    size and sign each crop (or render one procedural style at every size), then JPEG
+    encode each meta["variants"] path — the only encode a stock photo goes through.
+    Returns the style name.
+    """
+    cfg = config or CONFIG
+    max_rss_mb = (cfg.get("render") or {}).get("max_rss_mb")
+    FRAMES.max_rss = int(max_rss_mb * 2**20) if max_rss_mb else None
+    variants = meta.get("variants") or {"landscape": meta["image"]}
+    if provider is not None:
+        # crop to each format, add small signature, save
+        crops = decode_crop(photo, [FORMATS[fmt] for fmt in variants])
+        imgs = {fmt: crops[FORMATS[fmt]] for fmt in variants}
+        style_name = f"stock:{provider}"
     else:
         # 2) Fallback to procedural visual
-        palette = pick_palette()
-        img, style_name = build_image(topic, palette)
-        img = add_signature_only(img, CONFIG["brand"]["signature_text"])
-        img.save(img_path, quality=95, subsampling=0)
-
-    with open(txt_path, "w", encoding="utf-8") as f:
-        f.write(text)
-
-    return {"image": img_path, "text": text, "topic": topic, "style": style_name or "procedural", "stamp": stamp}
+        palette = pick_palette(cfg)
+        with span("render", formats=len(variants)) as sp:
+            traced = sp is not NULL_SPAN
+            if traced:
+                FRAMES.reset_peak()
+                rss0 = current_rss()
+            by_size, style_name = build_images(meta["topic"], palette, [FORMATS[fmt] for fmt in variants],
+                                               meta.get("style"), cfg["brand"]["signature_text"])
+            imgs = {fmt: by_size[FORMATS[fmt]] for fmt in variants}
+            if traced:
+                # RSS is per process: concurrent album renders all show up in it
+                sp.set(style=style_name, process_rss_growth_bytes=max(0, current_rss() - rss0), **FRAMES.stats())
+
+    for fmt, img in imgs.items():
+        with span("analysis", format=fmt):
+            stats = ImageStats(img)
+        with span("signature", format=fmt):
+            img = add_signature_only(img, cfg["brand"]["signature_text"], stats)
+        with span("jpeg_encode", format=fmt) as sp:
+            img.save(variants[fmt], quality=95, subsampling=0)
+            sp.set(bytes_out=os.path.getsize(variants[fmt]))
+    return style_name
+
+def render_job(meta, provider, config, photo=None):
+    """Process-pool entry point; everything account-specific travels in `config`."""
+    return render_image(meta, provider, config, photo)
+
+def build(config=None, tag="", render=None, topic=None, style=None):
+    """
+    `render(meta, provider, config, photo) -> style_name` lets callers move the CPU-bound
+    half elsewhere (e.g. a shared process pool); defaults to rendering inline.
+    `topic` / `style` pin the topic and the procedural style instead of picking at random.
+    """
+    cfg = config or CONFIG
+    meta = plan_post(cfg, tag, topic)
+    if style:
+        meta["style"] = style
+
+    # 1) Try stock photos (healthiest provider first, within the stock budget)
+    with span("stock") as sp:
+        provider, photo = fetch_stock(meta["topic"], settings=cfg.get("stock", {}))
+        sp.set(provider=provider)
+
+    style_name = (render or render_image)(meta, provider, cfg, photo)
+
+    with open(meta.pop("txt"), "w", encoding="utf-8") as f:
+        f.write(meta["text"])
+
+    meta["style"] = style_name or "procedural"
+    return meta
+
+def build_candidates(config=None, n=3, tag="", render=None):
+    """
+    N posts built concurrently, with distinct topics and styles where there are enough.
+    Stock fetches overlap; renders run inline or on whatever `render` uses.
+    Failed candidates are dropped. With fewer than 2 left the result is a single post
+    (built once more if none made it), for the caller to send as a plain preview.
+    """
+    cfg = config or CONFIG
+    topics, styles = cfg["topics"], list(STYLE_VARIANTS)
+    topics = random.sample(topics, n) if len(topics) >= n else [random.choice(topics) for _ in range(n)]
+    styles = random.sample(styles, n) if len(styles) >= n else [random.choice(styles) for _ in range(n)]
+    run, account = current_run(), http_pool.current_account()
+
+    def one(k):
+        attach(run)
+        http_pool.set_account(account)
+        with span("candidate", index=k):
+            return build(cfg, f"{tag}_c{k}" if tag else f"c{k}", render, topics[k-1], styles[k-1])
+
+    with ThreadPoolExecutor(max_workers=n, thread_name_prefix="candidate") as ex:
+        futures = [ex.submit(one, k) for k in range(1, n + 1)]
+    built = []
+    for k, f in enumerate(futures, 1):
+        try:
+            built.append(f.result())
+        except Exception as e:
+            print(f"Candidate {k} failed: {e.__class__.__name__}: {e}")
+    if len(built) >= 2:
+        return built
+    return built or [build(cfg, tag, render)]
+
+_log_lock = threading.Lock()
 
 def append_logs(meta, status="PREVIEW"):
+    with _log_lock:
+        _append_logs(meta, status)
+
+def _append_logs(meta, status):
     exists = os.path.exists(LOG_CSV)
     with open(LOG_CSV, "a", newline="", encoding="utf-8") as f:
         w = csv.writer(f)
@@ -0,0 +1,97 @@
+# http_pool.py
+"""
+One pooled HTTP client for the whole process + token-bucket rate limits.
+
+All API calls go through get/post/put(api, url, ...), where `api` is one of
+"telegram", "linkedin", "pexels", "openverse". Before each call we take a token
+from the process-wide bucket for that api and, if an account is active on this
+thread (set_account), from that account's bucket for the api too.
+No limits are configured by default, so single-account runs are unaffected.
+
+    configure({"linkedin": {"rate": 1, "burst": 3},
+               "per_account": {"linkedin": {"rate": 0.2, "burst": 2}}})
+"""
+import time, threading
+import requests
+from requests.adapters import HTTPAdapter
+
+SESSION = requests.Session()
+_adapter = HTTPAdapter(pool_connections=16, pool_maxsize=64)
+SESSION.mount("https://", _adapter)
+SESSION.mount("http://", _adapter)
+
+class TokenBucket:
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(burst))
+        self.tokens = self.capacity
+        self.ts = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.ts) * self.rate)
+                self.ts = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+_local = threading.local()
+_lock = threading.Lock()
+_global_limits = {}      # api -> TokenBucket
+_account_specs = {}      # api -> {"rate","burst"}
+_account_buckets = {}    # (account, api) -> TokenBucket
+
+def configure(limits):
+    """Replace rate limits. `limits` maps api -> {rate, burst}; `per_account` holds the per-account specs."""
+    limits = dict(limits or {})
+    per_account = limits.pop("per_account", {}) or {}
+    with _lock:
+        _global_limits.clear()
+        _account_buckets.clear()
+        _account_specs.clear()
+        for api, spec in limits.items():
+            if spec and spec.get("rate"):
+                _global_limits[api] = TokenBucket(spec["rate"], spec.get("burst", 1))
+        for api, spec in per_account.items():
+            if spec and spec.get("rate"):
+                _account_specs[api] = spec
+
+def set_account(name):
+    _local.account = name
+
+def current_account():
+    return getattr(_local, "account", None)
+
+def throttle(api):
+    bucket = _global_limits.get(api)
+    if bucket is not None:
+        bucket.acquire()
+    acct = current_account()
+    if acct is None or api not in _account_specs:
+        return
+    key = (acct, api)
+    with _lock:
+        b = _account_buckets.get(key)
+        if b is None:
+            spec = _account_specs[api]
+            b = _account_buckets[key] = TokenBucket(spec["rate"], spec.get("burst", 1))
+    b.acquire()
+
+def request(api, method, url, **kw):
+    throttle(api)
+    return SESSION.request(method, url, **kw)
+
+def get(api, url, **kw):
+    return request(api, "GET", url, **kw)
+
+def post(api, url, **kw):
+    return request(api, "POST", url, **kw)
+
+def put(api, url, **kw):
+    return request(api, "PUT", url, **kw)
@@ -0,0 +1,104 @@
+# image_stats.py
+"""
+Integral images (summed-area tables) of luminance for placement and color choices.
+
+    st = ImageStats(img)                  # ~7-8 ms for 1600x900
+    st.mean(box), st.variance(box)        # O(1): four lookups per table
+    box = st.quietest(candidate_boxes)    # lowest luminance variance
+    rgb = best_accent(st, colors, box)    # highest worst-case contrast
+
+Pillow box-averages luminance and luminance² into `cell`-pixel cells (C speed,
+no numpy); the two tables are then summed over that small grid. Boxes snap
+outwards to whole cells, which is plenty for picking corners and colors.
+"""
+import math, array, operator
+from itertools import accumulate
+from PIL import ImageMath
+
+def _sat(img):
+    """Summed-area table of an "F" image as (h+1) rows of (w+1) floats."""
+    w, h = img.size
+    data = array.array("f", img.tobytes())
+    prev = [0.0] * (w + 1)
+    table = [prev]
+    for y in range(h):
+        row = [0.0]
+        row += accumulate(data[y*w:(y+1)*w])
+        prev = list(map(operator.add, prev, row))
+        table.append(prev)
+    return table
+
+class ImageStats:
+    def __init__(self, img, cell=16):
+        self.size = img.size
+        self.cell = cell
+        # squares from full-resolution pixels: squaring after any averaging drops the
+        # variance inside each averaged block (a 2x2 pre-reduce read noise ~4x calm)
+        lum = img.convert("L").convert("F")
+        sq = ImageMath.lambda_eval(lambda a: a["lum"] * a["lum"], lum=lum)
+        small = lum.reduce(cell)
+        self.cols, self.rows = small.size
+        self.sat = _sat(small)
+        self.sat2 = _sat(sq.reduce(cell))
+
+    def _cells(self, box):
+        x0, y0, x1, y1 = box
+        c = self.cell
+        cx0 = min(max(int(x0 // c), 0), self.cols - 1)
+        cy0 = min(max(int(y0 // c), 0), self.rows - 1)
+        cx1 = min(max(math.ceil(x1 / c), cx0 + 1), self.cols)
+        cy1 = min(max(math.ceil(y1 / c), cy0 + 1), self.rows)
+        return cx0, cy0, cx1, cy1
+
+    @staticmethod
+    def _sum(t, cx0, cy0, cx1, cy1):
+        return t[cy1][cx1] - t[cy0][cx1] - t[cy1][cx0] + t[cy0][cx0]
+
+    def mean(self, box=None):
+        """Mean luminance (0–255) of `box` (x0, y0, x1, y1), default the whole image."""
+        cells = self._cells(box or (0, 0) + self.size)
+        n = (cells[2] - cells[0]) * (cells[3] - cells[1])
+        return self._sum(self.sat, *cells) / n
+
+    def variance(self, box=None):
+        cells = self._cells(box or (0, 0) + self.size)
+        n = (cells[2] - cells[0]) * (cells[3] - cells[1])
+        m = self._sum(self.sat, *cells) / n
+        return max(0.0, self._sum(self.sat2, *cells) / n - m * m)
+
+    def quietest(self, boxes):
+        """The box with the lowest luminance variance; earlier boxes win ties."""
+        return min(boxes, key=self.variance)
+
+# ----------------------------- contrast ---------------------------------------
+
+def _linear(c):
+    c = min(max(c, 0.0), 255.0) / 255
+    return c / 12.92 if c <= 0.04045 else ((c + 0.055) / 1.055) ** 2.4
+
+def relative_luminance(rgb):
+    r, g, b = (_linear(c) for c in rgb[:3])
+    return 0.2126 * r + 0.7152 * g + 0.0722 * b
+
+def contrast_ratio(l1, l2):
+    """WCAG contrast between two relative luminances (1–21)."""
+    hi, lo = max(l1, l2), min(l1, l2)
+    return (hi + 0.05) / (lo + 0.05)
+
+def best_accent(stats, candidates, box=None, min_ratio=3.0):
+    """
+    First candidate color whose worst-case contrast against `box` reaches
+    `min_ratio`, else the one with the best worst case. The background is taken
+    as mean luminance ± one standard deviation, so busy areas ask for more.
+    """
+    m, sd = stats.mean(box), math.sqrt(stats.variance(box))
+    dark, light = _linear(m - sd), _linear(m + sd)
+
+    def worst(rgb):
+        lum = relative_luminance(rgb)
+        return min(contrast_ratio(lum, dark), contrast_ratio(lum, light))
+
+    for rgb in candidates:
+        if worst(rgb) >= min_ratio:
+            return rgb
+    return max(candidates, key=worst)
@@ -1,6 +1,8 @@
 import os
 import json
-import requests
+from urllib.parse import quote
+import http_pool
+from tracing import span
 
 # Env (refresh-token path optional; we mainly use LI_ACCESS_TOKEN for now)
 LI_CLIENT_ID     = os.environ.get("LI_CLIENT_ID")
@@ -9,19 +11,34 @@ LI_REDIRECT_URI  = os.environ.get("LI_REDIRECT_URI")
 LI_REFRESH_TOKEN = os.environ.get("LI_REFRESH_TOKEN")
 LI_ACCESS_TOKEN  = os.environ.get("LI_ACCESS_TOKEN")  # direct token from OAuth tool
 
-LI_API = "https://api.linkedin.com"
+LI_API   = os.environ.get("LI_API_BASE", "https://api.linkedin.com")
+LI_OAUTH = os.environ.get("LI_OAUTH_BASE", "https://www.linkedin.com")
 RESTLI = {"X-Restli-Protocol-Version": "2.0.0"}
 
 class LinkedInError(Exception):
-    pass
+    """`status` is the HTTP status (None for local errors); `retry_after` is seconds from a 429/503."""
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+def _retry_after(r):
+    try:
+        return float(r.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+def _http_error(what, r):
+    return LinkedInError(f"{what}: {r.status_code} {r.text}", status=r.status_code, retry_after=_retry_after(r))
 
 def get_access_token():
     """
     Prefers refresh-token flow if provided, otherwise uses LI_ACCESS_TOKEN directly.
     """
     if LI_REFRESH_TOKEN:
-        r = requests.post(
-            "https://www.linkedin.com/oauth/v2/accessToken",
+        r = http_pool.post(
+            "linkedin",
+            f"{LI_OAUTH}/oauth/v2/accessToken",
             data={
                 "grant_type": "refresh_token",
                 "refresh_token": LI_REFRESH_TOKEN,
@@ -31,7 +48,7 @@ def get_access_token():
             timeout=30,
         )
         if r.status_code >= 400:
-            raise LinkedInError(f"Refresh token exchange failed: {r.status_code} {r.text}")
+            raise _http_error("Refresh token exchange failed", r)
         return r.json()["access_token"]
 
     if LI_ACCESS_TOKEN:
@@ -45,7 +62,7 @@ def get_person_urn(token: str) -> str:
     Fallback to /v2/me (requires r_liteprofile) if userinfo is unavailable.
     """
     try:
-        r = requests.get(f"{LI_API}/v2/userinfo", headers={"Authorization": f"Bearer {token}"}, timeout=30)
+        r = http_pool.get("linkedin", f"{LI_API}/v2/userinfo", headers={"Authorization": f"Bearer {token}"}, timeout=30)
         if r.status_code == 200:
             lid = r.json().get("sub")
             if lid:
@@ -53,9 +70,9 @@ def get_person_urn(token: str) -> str:
     except Exception:
         pass  # fall back to /v2/me
 
-    r = requests.get(f"{LI_API}/v2/me", headers={"Authorization": f"Bearer {token}"}, timeout=30)
+    r = http_pool.get("linkedin", f"{LI_API}/v2/me", headers={"Authorization": f"Bearer {token}"}, timeout=30)
     if r.status_code >= 400:
-        raise LinkedInError(f"/v2/me failed: {r.status_code} {r.text}")
+        raise _http_error("/v2/me failed", r)
     lid = r.json().get("id")
     if not lid:
         raise LinkedInError("Could not extract LinkedIn member id.")
@@ -68,24 +85,50 @@ def upload_image_and_get_urn(token: str, person_urn: str, image_path: str) -> st
     init_url = f"{LI_API}/v2/images?action=initializeUpload"
     init_body = {"initializeUploadRequest": {"owner": person_urn}}
     rh = {"Authorization": f"Bearer {token}", **RESTLI, "Content-Type": "application/json"}
-    r = requests.post(init_url, headers=rh, json=init_body, timeout=30)
+    with span("linkedin.image_init") as sp:
+        r = http_pool.post("linkedin", init_url, headers=rh, json=init_body, timeout=30)
+        sp.http(r)
     if r.status_code >= 400:
-        raise LinkedInError(f"Image init failed: {r.status_code} {r.text}")
+        raise _http_error("Image init failed", r)
     data = r.json()
     upload_url = data["value"]["uploadUrl"]
     image_urn  = data["value"]["image"]
 
     with open(image_path, "rb") as f:
-        ur = requests.put(upload_url, data=f.read(), headers={"Authorization": f"Bearer {token}"}, timeout=60)
-        if ur.status_code >= 400:
-            raise LinkedInError(f"Image upload failed: {ur.status_code} {ur.text}")
+        payload = f.read()
+    with span("linkedin.image_upload", bytes_out=len(payload)) as sp:
+        ur = http_pool.put("linkedin", upload_url, data=payload, headers={"Authorization": f"Bearer {token}"}, timeout=60)
+        sp.http(ur)
+    if ur.status_code >= 400:
+        raise _http_error("Image upload failed", ur)
 
     return image_urn
 
+def find_share_with_image(token: str, person_urn: str, image_urn: str, count: int = 20):
+    """
+    The author's recent share carrying `image_urn` ({"id": ...}), or None.
+    Used to tell whether an ambiguous ugcPosts failure actually created the post;
+    raises LinkedInError when the shares can't be listed (e.g. missing r_member_social).
+    """
+    url = (f"{LI_API}/v2/ugcPosts?q=authors&authors=List({quote(person_urn, safe='')})"
+           f"&sortBy=LAST_MODIFIED&count={count}")
+    with span("linkedin.find_share") as sp:
+        r = http_pool.get("linkedin", url, headers={"Authorization": f"Bearer {token}", **RESTLI}, timeout=30)
+        sp.http(r)
+    if r.status_code >= 400:
+        raise _http_error("Share lookup failed", r)
+    for el in r.json().get("elements", []):
+        share = (el.get("specificContent") or {}).get("com.linkedin.ugc.ShareContent") or {}
+        if any(m.get("media") == image_urn for m in share.get("media", [])):
+            return {"id": el.get("id")}
+    return None
+
 def create_ugc_post(token: str, person_urn: str, message_text: str, image_urn: str) -> dict:
     """
-    Create a public UGC image post.
+    Create a public UGC image post. LinkedIn has no idempotency key for this call:
+    callers that retry must check find_share_with_image() first.
     """
+    headers = {"Authorization": f"Bearer {token}", **RESTLI, "Content-Type": "application/json"}
     url = f"{LI_API}/v2/ugcPosts"
     body = {
         "author": person_urn,
@@ -99,18 +142,23 @@ def create_ugc_post(token: str, person_urn: str, message_text: str, image_urn: s
         },
         "visibility": {"com.linkedin.ugc.MemberNetworkVisibility": "PUBLIC"},
     }
-    r = requests.post(
-        url,
-        headers={"Authorization": f"Bearer {token}", **RESTLI, "Content-Type": "application/json"},
-        json=body,
-        timeout=30,
-    )
+    with span("linkedin.ugc_post") as sp:
+        r = http_pool.post(
+            "linkedin",
+            url,
+            headers=headers,
+            json=body,
+            timeout=30,
+        )
+        sp.http(r)
     if r.status_code >= 400:
-        raise LinkedInError(f"UGC post failed: {r.status_code} {r.text}")
+        raise _http_error("UGC post failed", r)
     return r.json()
 
-def post_with_image(image_path: str, message_text: str) -> dict:
-    token = get_access_token()
-    person_urn = get_person_urn(token)
+def post_with_image(image_path: str, message_text: str, token: str = None) -> dict:
+    """`token` lets multi-account callers post as someone other than the env account."""
+    token = token or get_access_token()
+    with span("linkedin.person_urn"):
+        person_urn = get_person_urn(token)
     image_urn = upload_image_and_get_urn(token, person_urn, image_path)
     return create_ugc_post(token, person_urn, message_text, image_urn)
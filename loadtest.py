@@ -0,0 +1,139 @@
+# loadtest.py
+"""
+Offline end-to-end load test: starts the fakes from fake_services.py, points the
+pipeline at them via the *_API_BASE env vars and calls main.run_once() many times.
+
+    python loadtest.py --runs 20 --latency-ms 50 --error-rate 0.05 --script ANOTHER,APPROVE
+    python loadtest.py --runs 5 --album 4        # one media-group round per run
+
+Outputs and logs go to a temp dir (not out/ or content_log.*). Prints posts/minute,
+outcome counts, per-stage p50/p95 (from the trace records) and fake-server stats.
+"""
+import os, sys, copy, time, argparse, tempfile, traceback
+import yaml
+
+from fake_services import FakeSettings, FakeTelegram, FakeLinkedIn, FakePexels, FakeOpenverse
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Offline load test for the LinkedIn auto-poster")
+    ap.add_argument("--runs", type=int, default=10)
+    ap.add_argument("--config", default=os.path.join(ROOT, "config.yaml"))
+    ap.add_argument("--latency-ms", type=float, default=20.0, help="added latency on every fake")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="probability of an injected 500")
+    ap.add_argument("--ghost-rate", type=float, default=0.0,
+                    help="probability ugcPosts creates the share but answers 500")
+    ap.add_argument("--rate-limit", type=float, default=0.0, help="req/s per fake before 429 (0 = off)")
+    ap.add_argument("--script", default="APPROVE",
+                    help="comma list of Telegram reactions, cycled: APPROVE,SKIP,ANOTHER,NONE")
+    ap.add_argument("--react-ms", type=float, default=200.0, help="simulated user reaction time")
+    ap.add_argument("--album", type=int, default=0, help="telegram.album_size: N candidates per preview round")
+    ap.add_argument("--accounts", type=int, default=0,
+                    help="run N accounts concurrently through multi_account.run_all per round")
+    ap.add_argument("--no-stock", action="store_true", help="leave PEXELS_API_KEY unset and break Openverse")
+    return ap.parse_args(argv)
+
+def start_fakes(args):
+    s = FakeSettings(latency_ms=args.latency_ms, error_rate=args.error_rate, rate_limit=args.rate_limit)
+    fakes = {
+        "telegram":  FakeTelegram(chat_id="1000", script=args.script.split(","), react_ms=args.react_ms, settings=s),
+        "linkedin":  FakeLinkedIn(settings=s, ghost_rate=args.ghost_rate),
+        "pexels":    FakePexels(settings=s),
+        "openverse": FakeOpenverse(settings=s),
+    }
+    for f in fakes.values():
+        f.start()
+    return fakes
+
+def point_env_at(fakes, workdir, args):
+    """Must run before the pipeline modules are imported: they read env at import time."""
+    os.environ.update({
+        "TELEGRAM_BOT_TOKEN": "000:fake",
+        "TELEGRAM_CHAT_ID":   fakes["telegram"].chat_id,
+        "TELEGRAM_API_BASE":  fakes["telegram"].base_url,
+        "LI_ACCESS_TOKEN":    "fake-token",
+        "LI_API_BASE":        fakes["linkedin"].base_url,
+        "LI_OAUTH_BASE":      fakes["linkedin"].base_url,
+        "PEXELS_API_BASE":    fakes["pexels"].base_url,
+        "OPENVERSE_API_BASE": "http://127.0.0.1:9" if args.no_stock else fakes["openverse"].base_url,
+        "TRACE":              "1",
+        "TRACE_PATH":         os.path.join(workdir, "traces.jsonl"),
+        "PROVIDER_HEALTH_PATH": os.path.join(workdir, "provider_health.json"),
+        "OUTBOX_DIR":         os.path.join(workdir, "outbox"),
+    })
+    os.environ.pop("LI_REFRESH_TOKEN", None)
+    if args.no_stock:
+        os.environ.pop("PEXELS_API_KEY", None)
+    else:
+        os.environ["PEXELS_API_KEY"] = "fake-key"
+
+def load_config(path):
+    with open(path, "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f)
+    if not isinstance(cfg, dict):
+        raise SystemExit(f"{path} has no settings (is everything commented out?)")
+    cfg = copy.deepcopy(cfg)
+    cfg.setdefault("dry_run", {})["enabled"] = False
+    cfg.setdefault("telegram", {})["approval_timeout_minutes"] = 1
+    cfg.setdefault("outbox", {}).update(base_backoff_seconds=0.5, max_backoff_seconds=5, inline_wait_seconds=30)
+    return cfg
+
+def main(argv=None):
+    args = parse_args(argv)
+    cfg = load_config(args.config)
+    if args.album:
+        cfg["telegram"]["album_size"] = args.album
+    workdir = tempfile.mkdtemp(prefix="poster-load-")
+    fakes = start_fakes(args)
+    point_env_at(fakes, workdir, args)
+
+    import main as poster
+    import generate_post, tracing
+    poster.CONFIG = generate_post.CONFIG = cfg
+    generate_post.OUT = os.path.join(workdir, "out")
+    generate_post.LOG_CSV = os.path.join(workdir, "content_log.csv")
+    generate_post.LOG_MD = os.path.join(workdir, "content_log.md")
+
+    outcomes = {"ok": 0, "exit_1": 0, "crashed": 0}
+    t0 = time.monotonic()
+    if args.accounts:
+        import multi_account
+        accounts = [multi_account.Account(
+            name=f"acct{n}", config=cfg, li_token=f"fake-token-{n}",
+            bot={"token": os.environ["TELEGRAM_BOT_TOKEN"], "chat_id": str(2000 + n)},
+        ) for n in range(args.accounts)]
+        for i in range(args.runs):
+            for code in multi_account.run_all(accounts, cfg.get("rate_limits"), force=True).values():
+                outcomes["ok" if code == 0 else "exit_1"] += 1
+    else:
+        for i in range(args.runs):
+            try:
+                code = poster.run_once(force=True)
+                outcomes["ok" if code == 0 else "exit_1"] += 1
+            except Exception as e:
+                outcomes["crashed"] += 1
+                print(f"[run {i+1}] crashed: {e.__class__.__name__}: {e}", file=sys.stderr)
+                traceback.print_exc(limit=2)
+    elapsed = time.monotonic() - t0
+
+    posted = len(fakes["linkedin"].posts) - fakes["linkedin"].duplicates
+    print("\n=== load test ===")
+    print(f"runs: {args.runs} x {max(1, args.accounts)} account(s)   elapsed: {elapsed:.1f}s   posted: {posted}   "
+          f"posts/minute: {posted / (elapsed / 60):.2f}")
+    print("outcomes: " + ", ".join(f"{k}={v}" for k, v in outcomes.items())
+          + f"   duplicate shares: {fakes['linkedin'].duplicates}")
+    print()
+    tracing.summarize(os.environ["TRACE_PATH"])
+    print()
+    print(f"{'fake':<12}{'requests':>10}{'errors':>10}{'429s':>10}")
+    for name, f in fakes.items():
+        print(f"{name:<12}{f.stats.requests:>10}{f.stats.errors_injected:>10}{f.stats.rate_limited:>10}")
+    print(f"\nartifacts: {workdir}")
+
+    for f in fakes.values():
+        f.stop()
+    return 0 if outcomes["crashed"] == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
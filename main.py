@@ -1,17 +1,23 @@
-import os, json, uuid, pytz, datetime, yaml, requests
-from generate_post import build, append_logs
-from telegram_approval import send_preview, wait_for_approval
-from linkedin_api import post_with_image
+import os, json, uuid, pytz, datetime, yaml
+import http_pool
+from generate_post import build, build_candidates, append_logs
+from framepool import RenderBudgetExceeded
+from telegram_approval import send_preview, send_album, wait_for_approval
+import outbox
+from tracing import start_run, span
 
 TG_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN")
 TG_CHAT  = os.environ.get("TELEGRAM_CHAT_ID")
+TG_API   = os.environ.get("TELEGRAM_API_BASE", "https://api.telegram.org")
 
-def tg_notify(text: str):
-    if not (TG_TOKEN and TG_CHAT): return
+def tg_notify(text: str, bot=None):
+    token, chat = (bot["token"], bot["chat_id"]) if bot else (TG_TOKEN, TG_CHAT)
+    if not (token and chat): return
     try:
-        requests.post(
-            f"https://api.telegram.org/bot{TG_TOKEN}/sendMessage",
-            data={"chat_id": TG_CHAT, "text": text},
+        http_pool.post(
+            "telegram",
+            f"{TG_API}/bot{token}/sendMessage",
+            data={"chat_id": chat, "text": text},
             timeout=15,
         )
     except Exception:
@@ -20,67 +26,145 @@ def tg_notify(text: str):
 with open("config.yaml", "r", encoding="utf-8") as f:
     CONFIG = yaml.safe_load(f)
 
-def is_scheduled_now() -> bool:
+def is_scheduled_now(config=None) -> bool:
+    sched = (config or CONFIG)["post_schedule"]
     tz = pytz.timezone("Asia/Jerusalem")
     now = datetime.datetime.now(tz)
     day = now.strftime("%a").upper()
     time_str = now.strftime("%H:%M")
-    return (day in CONFIG["post_schedule"]["days"]) and (time_str == CONFIG["post_schedule"]["local_time"])
+    return (day in sched["days"]) and (time_str == sched["local_time"])
 
-def run_once(force: bool = False) -> int:
-    if (not force) and (not is_scheduled_now()):
+def run_once(force: bool = False, account=None, render=None) -> int:
+    """
+    `account` (see multi_account.Account) swaps in that member's config, Telegram
+    chat and LinkedIn token; `render` is forwarded to build(). Both default to
+    the single-account globals.
+    """
+    cfg = account.config if account else CONFIG
+    # Approved posts left over from earlier runs go out first, schedule or not
+    _publisher(account).drain(wait_up_to=0)
+
+    if (not force) and (not is_scheduled_now(cfg)):
         print("Not scheduled time; exiting.")
         return 0
 
+    # One trace record per run (no-op unless TRACE=1)
+    attrs = {"account": account.name} if account else {}
+    with start_run("run_once", force=force, **attrs) as run:
+        code = _run_once(account, render)
+        run.set(exit_code=code)
+        return code
+
+def _publisher(account=None):
+    cfg = account.config if account else CONFIG
+    bot = account.bot if account else None
+
+    def on_result(item, status):
+        meta = {**item["meta"], "image": item["image"], "text": item["text"]}
+        if status == "POSTED":
+            append_logs(meta, "POSTED")
+            print(json.dumps({"status": "posted", "linkedin_response": item["post"]}, ensure_ascii=False))
+        elif status == "RETRY":
+            append_logs(meta, f"RETRY:{item['last_error']}")
+            print(f"Post failed, retry scheduled: {item['last_error']}")
+            if item["attempts"] == 1:
+                tg_notify(f"⏳ Post failed, will retry from the outbox: {item['last_error']}", bot)
+        elif status == "NEEDS_CHECK":
+            append_logs(meta, f"NEEDS_CHECK:{item['last_error']}")
+            print(f"Post may already be live, parked for a manual check: {item['last_error']}")
+            tg_notify(f"⚠️ Couldn't confirm whether the post went live ({item['last_error']}). "
+                      f"Check LinkedIn, then `python outbox.py requeue {item['id']}` if it isn't there.", bot)
+        else:
+            append_logs(meta, f"FAILED:{item['last_error']}")
+            print(f"Failed to post: {item['last_error']}")
+            tg_notify(f"❌ Post failed after {item['attempts']} attempts: {item['last_error']}", bot)
+
+    return outbox.Publisher(
+        settings=cfg.get("outbox", {}),
+        token=account.li_token if account else None,
+        account=account.name if account else "",
+        on_result=on_result,
+    )
+
+def _run_once(account=None, render=None) -> int:
+    cfg   = account.config if account else CONFIG
+    bot   = account.bot if account else None
+    tag   = account.name if account else ""
+    # album mode: N candidates per round in one media group (Telegram allows 2–10)
+    album = int(cfg.get("telegram", {}).get("album_size", 1) or 1)
+    album = 1 if album < 2 else min(album, 10)
+
     # Build + interactive loop
     attempts = 0
     while True:
         attempts += 1
-        meta = build()  # {"image","text","topic","stamp",...}
+        try:
+            with span("build", attempt=attempts, candidates=album) as sp:
+                if album > 1:
+                    candidates = build_candidates(cfg, album, tag=tag, render=render)
+                    sp.set(built=len(candidates))
+                else:
+                    candidates = [build(cfg, tag=tag, render=render)]  # {"image","text","topic","stamp",...}
+        except RenderBudgetExceeded as e:
+            print(f"Render over the memory budget: {e}")
+            tg_notify(f"⚠️ Couldn't render a preview within render.max_rss_mb: {e}", bot)
+            return 1
         approval_code = uuid.uuid4().hex[:6].upper()
-        send_preview(meta["image"], meta["text"], approval_code)
+        if len(candidates) > 1:
+            send_album(candidates, approval_code, bot=bot)
+        else:
+            send_preview(candidates[0]["image"], candidates[0]["text"], approval_code, bot=bot)
 
         # Dry-run: preview only
-        if CONFIG.get("dry_run", {}).get("enabled", False):
-            append_logs(meta, "DRY_RUN_PREVIEW")
+        if cfg.get("dry_run", {}).get("enabled", False):
+            for meta in candidates:
+                append_logs(meta, "DRY_RUN_PREVIEW")
             print("Dry-run enabled; not waiting for approval.")
             return 0
 
-        decision = wait_for_approval(
-            approval_code,
-            CONFIG.get("telegram", {}).get("approval_timeout_minutes", 120),
-        )
-
-        if decision is True:  # APPROVE
-            try:
-                res = post_with_image(meta["image"], meta["text"])
-                append_logs(meta, "POSTED")
-                print(json.dumps({"status": "posted", "linkedin_response": res}, ensure_ascii=False))
-                return 0
-            except Exception as e:
-                append_logs(meta, f"FAILED:{e}")
-                print(f"Failed to post: {e}")
-                tg_notify(f"❌ Post failed: {e.__class__.__name__}: {e}")
-                return 1
+        with span("approval_wait") as sp:
+            decision = wait_for_approval(
+                approval_code,
+                cfg.get("telegram", {}).get("approval_timeout_minutes", 120),
+                bot=bot,
+                choices=len(candidates),
+            )
+            sp.set(decision=str(decision))
 
         if decision is False:  # SKIP (do not auto-rerun now)
-            append_logs(meta, "SKIPPED")
+            for meta in candidates:
+                append_logs(meta, "SKIPPED")
             print("User skipped.")
             return 0
 
         if decision == "ANOTHER":
-            append_logs(meta, "ANOTHER_REQUESTED")
+            for meta in candidates:
+                append_logs(meta, "ANOTHER_REQUESTED")
             # Guard: avoid infinite loops
             if attempts >= 5:
-                tg_notify("⚠️ Reached max 'another idea' attempts (5). Stopping.")
+                tg_notify("⚠️ Reached max 'another idea' attempts (5). Stopping.", bot)
                 return 0
             # loop continues → build a fresh one
             continue
 
-        # No decision within timeout
-        append_logs(meta, "NO_APPROVAL")
-        print("No approval within timeout; exiting.")
-        return 0
+        if decision is None:  # No decision within timeout
+            for meta in candidates:
+                append_logs(meta, "NO_APPROVAL")
+            print("No approval within timeout; exiting.")
+            return 0
+
+        # APPROVE → durable outbox first, network after. True only comes back for a
+        # single preview; an album answer is always the picked candidate's index.
+        pick = 0 if decision is True else decision
+        meta = candidates[pick]
+        for other in candidates:
+            if other is not meta:
+                append_logs(other, "NOT_PICKED")
+        item = outbox.enqueue(meta, approval_code, account=tag)
+        append_logs(meta, "APPROVED")
+        with span("publish", pick=pick):
+            _publisher(account).drain()
+        return 0 if outbox.load(item["id"])["state"] == "posted" else 1
 
 if __name__ == "__main__":
     force = os.environ.get("FORCE_RUN") == "1"
@@ -0,0 +1,115 @@
+# multi_account.py
+"""
+Run the poster for several team members from one process.
+
+    python multi_account.py [accounts.yaml]      (FORCE_RUN=1 ignores schedules)
+
+Each account gets its own thread for the network/approval loop (so one slow
+approval never blocks the others), while all accounts share:
+  - one process pool for the CPU-bound render step (stock decode/crop or procedural
+    render, signature, encode; sized to the cores)
+  - one pooled HTTP client with per-api and per-account token buckets (http_pool)
+  - one Telegram update poller per bot token (telegram_approval.ApprovalHub)
+"""
+import os, sys, copy, threading, multiprocessing
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import yaml
+
+import http_pool
+import main as poster
+from generate_post import render_job
+from tracing import span
+
+ROOT = os.path.dirname(__file__)
+ACCOUNTS_PATH = os.path.join(ROOT, "accounts.yaml")
+
+@dataclass
+class Account:
+    name: str
+    config: dict
+    bot: dict            # {"token", "chat_id"}
+    li_token: str = None
+
+def _deep_merge(base, over):
+    out = copy.deepcopy(base)
+    for k, v in (over or {}).items():
+        out[k] = _deep_merge(out[k], v) if isinstance(v, dict) and isinstance(out.get(k), dict) else v
+    return out
+
+def load_accounts(path=ACCOUNTS_PATH, base_config=None):
+    """
+    Returns (accounts, rate_limits). Secrets never live in the file: each account
+    names the env vars holding its bot token, chat id and LinkedIn token.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f) or {}
+    base = base_config or poster.CONFIG or {}
+    accounts = []
+    for a in data.get("accounts") or []:
+        cfg = base
+        if a.get("config"):
+            with open(os.path.join(ROOT, a["config"]), "r", encoding="utf-8") as f:
+                cfg = yaml.safe_load(f) or {}
+        cfg = _deep_merge(cfg, a.get("overrides"))
+        bot = {
+            "token":   os.environ.get(a.get("telegram_bot_token_env", "TELEGRAM_BOT_TOKEN")),
+            "chat_id": os.environ.get(a.get("telegram_chat_id_env", "TELEGRAM_CHAT_ID")),
+        }
+        if not (bot["token"] and bot["chat_id"]):
+            raise RuntimeError(f"Account {a['name']}: Telegram bot token / chat id env vars are not set.")
+        # no fallback to LI_ACCESS_TOKEN: that would post to another member's profile
+        li_token = os.environ.get(a.get("li_access_token_env") or "")
+        if not li_token:
+            raise RuntimeError(f"Account {a['name']}: li_access_token_env is missing or its env var is not set.")
+        accounts.append(Account(
+            name=a["name"],
+            config=cfg,
+            bot=bot,
+            li_token=li_token,
+        ))
+    return accounts, data.get("rate_limits") or {}
+
+class SharedRenderer:
+    """build()'s `render` hook backed by one process pool shared by all accounts."""
+    def __init__(self, pool):
+        self.pool = pool
+
+    def __call__(self, meta, provider, config, photo=None):
+        with span("render_pool") as sp:
+            style = self.pool.submit(render_job, meta, provider, config, photo).result()
+            sp.set(style=style)
+        return style
+
+def run_account(account, renderer, force=False):
+    http_pool.set_account(account.name)
+    threading.current_thread().name = f"account-{account.name}"
+    try:
+        return poster.run_once(force=force, account=account, render=renderer)
+    except Exception as e:
+        print(f"[{account.name}] unhandled error: {e.__class__.__name__}: {e}", file=sys.stderr)
+        poster.tg_notify(f"❌ Unhandled error: {e.__class__.__name__}: {e}", account.bot)
+        return 1
+
+def run_all(accounts, rate_limits=None, force=False, workers=None):
+    """Returns {account name: exit code}."""
+    http_pool.configure(rate_limits)
+    # Workers start lazily on the first submit(), from an account thread while the
+    # others, the approval poller and the HTTP pool are running; forking then could
+    # hand a worker a held lock (sprites, tracing, FramePool). forkserver children
+    # come from a clean single-threaded server instead.
+    ctx = multiprocessing.get_context("forkserver")
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 2, mp_context=ctx) as pool, \
+         ThreadPoolExecutor(max_workers=max(1, len(accounts)), thread_name_prefix="account") as threads:
+        renderer = SharedRenderer(pool)
+        futures = {a.name: threads.submit(run_account, a, renderer, force) for a in accounts}
+        return {name: f.result() for name, f in futures.items()}
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else ACCOUNTS_PATH
+    force = os.environ.get("FORCE_RUN") == "1"
+    accounts, limits = load_accounts(path)
+    results = run_all(accounts, limits, force=force)
+    for name, code in results.items():
+        print(f"{name}: exit={code}")
+    sys.exit(0 if all(c == 0 for c in results.values()) else 1)
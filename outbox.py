@@ -0,0 +1,299 @@
+# outbox.py
+"""
+Durable outbox for approved posts.
+
+Approval only writes a JSON file to outbox/ (local disk, no network). A publisher
+then drains due items: get token → person URN → image upload → ugcPosts, saving
+progress after each step, so a retry after a failed ugcPosts call reuses the
+already-uploaded image URN instead of uploading again.
+
+Failures are retried with exponential backoff (jittered, capped); a 429/503
+Retry-After wins when longer. Permanent rejections (400/403/422) go "dead" at
+once, as does an item after max_attempts; dead items stay on disk until requeued.
+
+LinkedIn has no idempotency key for ugcPosts, so double posting is guarded
+locally: an item marked "posted" is never sent again, a lock file keeps two
+publishers off the same item, and "posting_at" is saved right before the POST.
+An item that still carries it (timeout, 5xx, or a crash before the result was
+saved) may already be live: the next attempt looks for the uploaded image among
+the author's recent shares and only re-POSTs if it isn't there. When that lookup
+itself fails the item is parked as "needs_check" instead of risking a duplicate.
+
+    python outbox.py list | drain [--account NAME] | requeue <id>
+
+Items carry the account that approved them, and a publisher only touches its own
+account's items: "" is the single-account setup (env LinkedIn token), a named
+account needs its own token (from accounts.yaml in the CLI).
+"""
+import os, sys, json, time, uuid, random, datetime
+
+import linkedin_api
+from tracing import span
+
+ROOT = os.path.dirname(__file__)
+OUTBOX_DIR = os.environ.get("OUTBOX_DIR", os.path.join(ROOT, "outbox"))
+
+DEFAULTS = {
+    "max_attempts": 12,
+    "base_backoff_seconds": 30,
+    "max_backoff_seconds": 3600,
+    "inline_wait_seconds": 120,   # how long a run keeps retrying before leaving it to the next run
+}
+
+LOCK_STALE_SECONDS = 600
+
+# rejected as sent: retrying the same request can't succeed
+PERMANENT_STATUSES = (400, 403, 422)
+
+def _now():
+    return time.time()
+
+def _iso(ts):
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+# ----------------------------- storage ----------------------------------------
+
+def _path(item_id):
+    return os.path.join(OUTBOX_DIR, f"{item_id}.json")
+
+def save(item):
+    os.makedirs(OUTBOX_DIR, exist_ok=True)
+    tmp = _path(item["id"]) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(item, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, _path(item["id"]))
+
+def load(item_id):
+    with open(_path(item_id), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def items(state=None, account=None):
+    if not os.path.isdir(OUTBOX_DIR):
+        return []
+    out = []
+    for name in sorted(os.listdir(OUTBOX_DIR)):
+        if not name.endswith(".json"):
+            continue
+        try:
+            it = load(name[:-5])
+        except Exception:
+            continue
+        if state and it.get("state") != state:
+            continue
+        if account is not None and it.get("account", "") != account:
+            continue
+        out.append(it)
+    return out
+
+def enqueue(meta, approval_code, account=""):
+    """Persist an approved post. Local disk only — safe to call from the approval loop."""
+    item = {
+        "id": f"{meta['stamp']}-{approval_code}-{uuid.uuid4().hex[:6]}".lower(),
+        "state": "pending",
+        "account": account,
+        "image": meta["image"],
+        "text": meta["text"],
+        "meta": {k: meta.get(k) for k in ("stamp", "topic", "style")},
+        "approval": {"code": approval_code, "approved_at": _iso(_now())},
+        "attempts": 0,
+        "next_attempt_at": 0,
+        "last_error": None,
+        "person_urn": None,
+        "image_urn": None,
+        "posting_at": None,
+        "post": None,
+    }
+    save(item)
+    return item
+
+def requeue(item_id):
+    """
+    Back to pending. Requeueing a needs_check item means someone confirmed it is
+    not live, so its marker is dropped; any other item still gets checked first.
+    """
+    it = load(item_id)
+    posting_at = None if it["state"] == "needs_check" else it.get("posting_at")
+    it.update(state="pending", attempts=0, next_attempt_at=0, posting_at=posting_at)
+    save(it)
+    return it
+
+# ----------------------------- locking ----------------------------------------
+
+def _claim(item_id):
+    lock = _path(item_id) + ".lock"
+    try:
+        if _now() - os.path.getmtime(lock) > LOCK_STALE_SECONDS:
+            os.remove(lock)
+    except OSError:
+        pass
+    try:
+        fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        return True
+    except FileExistsError:
+        return False
+
+def _release(item_id):
+    try:
+        os.remove(_path(item_id) + ".lock")
+    except OSError:
+        pass
+
+# ----------------------------- publisher --------------------------------------
+
+class ShareCheckFailed(Exception):
+    """Couldn't tell whether an earlier ugcPosts call already created the post."""
+    def __init__(self, cause):
+        super().__init__(f"share check failed: {cause}")
+        self.status = getattr(cause, "status", None)
+        self.retry_after = getattr(cause, "retry_after", None)
+
+class Publisher:
+    """
+    Drains due outbox items of one `account` ("" = single-account, env LinkedIn token).
+    A named account must bring its own `token`: falling back to the env one would post
+    to somebody else's profile.
+    `on_result(item, status)` is called with "POSTED", "RETRY", "DEAD" or "NEEDS_CHECK".
+    """
+    def __init__(self, settings=None, token=None, account="", on_result=None):
+        if account and not token:
+            raise ValueError(f"No LinkedIn token for account {account!r}; refusing to publish its items.")
+        self.cfg = {**DEFAULTS, **(settings or {})}
+        self.token = token
+        self.account = account or ""
+        self.on_result = on_result
+
+    def backoff(self, attempts, retry_after=None):
+        delay = min(self.cfg["max_backoff_seconds"], self.cfg["base_backoff_seconds"] * 2 ** max(0, attempts - 1))
+        delay *= random.uniform(0.8, 1.2)
+        if retry_after:
+            delay = max(delay, retry_after)
+        return delay
+
+    def publish(self, item):
+        """One attempt; resumes from whatever step the item already completed."""
+        token = self.token or linkedin_api.get_access_token()
+        if not item.get("person_urn"):
+            with span("linkedin.person_urn"):
+                item["person_urn"] = linkedin_api.get_person_urn(token)
+            save(item)
+        if not item.get("image_urn"):
+            item["image_urn"] = linkedin_api.upload_image_and_get_urn(token, item["person_urn"], item["image"])
+            save(item)
+        if item.get("posting_at"):
+            # an earlier POST may have landed (timeout, 5xx, crash before saving the result)
+            try:
+                found = linkedin_api.find_share_with_image(token, item["person_urn"], item["image_urn"])
+            except Exception as e:
+                raise ShareCheckFailed(e) from e
+            if found:
+                return found
+        item["posting_at"] = _now()
+        save(item)
+        return linkedin_api.create_ugc_post(token, item["person_urn"], item["text"], item["image_urn"])
+
+    def attempt(self, item):
+        if not _claim(item["id"]):
+            return None
+        try:
+            item = load(item["id"])  # re-read under the lock
+            if item["state"] != "pending":
+                return item
+            item["attempts"] += 1
+            before = item.get("posting_at")
+            checking = bool(before)
+            with span("outbox.publish", item=item["id"], attempt=item["attempts"], checking=checking) as sp:
+                try:
+                    item["post"] = self.publish(item)
+                    item.update(state="posted", posted_at=_iso(_now()), last_error=None)
+                    status = "POSTED"
+                except Exception as e:
+                    status_code = getattr(e, "status", None)
+                    item["last_error"] = f"{e.__class__.__name__}: {e}"[:500]
+                    sp.set(status=status_code, error=item["last_error"])
+                    if isinstance(e, ShareCheckFailed) and status_code is not None and status_code < 500 and status_code != 429:
+                        # we can't list shares (scope, token): a person has to look before it goes again
+                        item["state"] = "needs_check"
+                        status = "NEEDS_CHECK"
+                    else:
+                        # a definite answer below 500 from ugcPosts itself means nothing was created
+                        reached_post = item.get("posting_at") != before
+                        if reached_post and status_code is not None and status_code < 500:
+                            item["posting_at"] = None
+                        # 401 means a stale token; start the next attempt clean in case it changed owner
+                        # (but keep the image URN while an earlier POST still needs checking)
+                        if status_code == 401 and not item.get("posting_at"):
+                            item["person_urn"] = item["image_urn"] = None
+                        if status_code in PERMANENT_STATUSES or item["attempts"] >= self.cfg["max_attempts"]:
+                            item["state"] = "dead"
+                            status = "DEAD"
+                        else:
+                            item["next_attempt_at"] = _now() + self.backoff(item["attempts"], getattr(e, "retry_after", None))
+                            status = "RETRY"
+            save(item)
+        finally:
+            _release(item["id"])
+        if self.on_result:
+            self.on_result(item, status)
+        return item
+
+    def drain(self, wait_up_to=None):
+        """
+        Attempt every due pending item (for this account). If retries come due within
+        `wait_up_to` seconds, sleep and keep going. Returns the items touched.
+        """
+        wait_up_to = self.cfg["inline_wait_seconds"] if wait_up_to is None else wait_up_to
+        deadline = _now() + wait_up_to
+        touched, busy = {}, set()
+        while True:
+            pending = [it for it in items("pending", self.account) if it["id"] not in busy]
+            for it in pending:
+                if it["next_attempt_at"] <= _now():
+                    res = self.attempt(it)
+                    if res is None:
+                        busy.add(it["id"])  # another publisher holds it
+                    else:
+                        touched[res["id"]] = res
+            pending = [it for it in items("pending", self.account) if it["id"] not in busy]
+            if not pending:
+                break
+            nxt = min(it["next_attempt_at"] for it in pending)
+            if nxt > deadline:
+                break
+            time.sleep(max(0.0, nxt - _now()))
+        return list(touched.values())
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "list"
+    if cmd == "list":
+        for it in items():
+            nxt = _iso(it["next_attempt_at"]) if it["state"] == "pending" and it["next_attempt_at"] else "-"
+            if it.get("posting_at"):
+                nxt += f"  posting_at={_iso(it['posting_at'])}"
+            print(f"{it['id']:<40}{it['state']:<9}{it['attempts']:>3}  next={nxt}  {it.get('last_error') or ''}")
+    elif cmd == "drain":
+        name = sys.argv[3] if len(sys.argv) > 3 and sys.argv[2] == "--account" else ""
+        if name:
+            import multi_account
+            accounts, _ = multi_account.load_accounts()
+            account = next((a for a in accounts if a.name == name), None)
+            if account is None:
+                print(f"Unknown account {name!r} (not in {multi_account.ACCOUNTS_PATH})")
+                sys.exit(2)
+            publisher = Publisher(account.config.get("outbox", {}), token=account.li_token, account=name)
+        else:
+            publisher = Publisher()
+        for it in publisher.drain(0):
+            print(f"{it['id']}: {it['state']}")
+        others = sorted({it.get("account", "") for it in items("pending")} - {name})
+        if others:
+            print(f"Skipped pending items of other accounts: {', '.join(a or '(default)' for a in others)} "
+                  f"(use drain --account NAME)")
+    elif cmd == "requeue" and len(sys.argv) > 2:
+        print(json.dumps(requeue(sys.argv[2]), ensure_ascii=False, indent=2))
+    else:
+        print("usage: python outbox.py list | drain [--account NAME] | requeue <id>")
+        sys.exit(2)
@@ -2,6 +2,7 @@
 import random, math
 from typing import Tuple
 from PIL import Image, ImageDraw
+from image_stats import ImageStats, best_accent
 
 RGBA = Tuple[int, int, int, int]
 
@@ -112,15 +113,22 @@ def build_guides(img, accent_rgb, alpha=110):
 
 # ---------- Public API ----------
 
-def apply_overlays(img, palette_hex):
+def apply_overlays(img, palette_hex, stats=None):
     """
     Adds mobile-dev construction vibes without text or logos.
     Palette hex -> choose accent for strokes that contrasts with bg.
+    `stats` (image_stats.ImageStats of img) is built here when not passed.
     """
     p1 = _hex_to_rgb(palette_hex[0])
     p2 = _hex_to_rgb(palette_hex[1])
-    # choose a bright-ish accent between p1 & white, to lift line art over bg
-    accent = _mix(p1, (255,255,255), 0.35)
+    # palette tints first (keeps the brand look), then plain light/dark; the first
+    # that reads against the actual pixels inside the guides wins
+    candidates = [_mix(p1, (255,255,255), 0.35), _mix(p2, (255,255,255), 0.35),
+                  _mix(p1, (255,255,255), 0.75), _mix(p1, (0,0,0), 0.6),
+                  (255,255,255), (24,24,24)]
+    stats = stats or ImageStats(img)
+    w, h = img.size
+    accent = best_accent(stats, candidates, box=(96, 96, w-96, h-96))
 
     # Always add subtle guides
     build_guides(img, accent)
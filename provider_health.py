@@ -0,0 +1,153 @@
+# provider_health.py
+"""
+Per-provider health for stock image sources, persisted across runs in
+provider_health.json (override with PROVIDER_HEALTH_PATH).
+
+For each provider we keep a short window of call latencies and outcomes.
+That gives us:
+  - a circuit breaker: N consecutive failures -> skip the provider for a cooldown,
+    then let one trial call through (half-open)
+  - an ordering: healthiest/fastest providers first
+  - an adaptive timeout: ~2x observed p95 latency, clamped to [min, max]
+
+Concurrent fetches (accounts, album candidates) use ProviderHealth.shared():
+one state dict and lock per file for the whole process, so every failure
+counts towards the breaker and the last save can't drop other fetches' samples.
+"""
+import os, json, time, threading
+
+ROOT = os.path.dirname(__file__)
+HEALTH_PATH = os.environ.get("PROVIDER_HEALTH_PATH", os.path.join(ROOT, "provider_health.json"))
+
+WINDOW = 50  # samples kept per provider
+
+DEFAULTS = {
+    "budget_seconds": 45,          # total wall time for all stock fetching in one run
+    "breaker_failures": 3,         # consecutive failures before the circuit opens
+    "breaker_cooldown_minutes": 30,
+    "min_timeout_seconds": 3,
+    "max_timeout_seconds": 25,
+}
+
+class BudgetExceeded(Exception):
+    pass
+
+def _p95(vals):
+    if not vals:
+        return None
+    s = sorted(vals)
+    return s[min(len(s) - 1, int(round(0.95 * (len(s) - 1))))]
+
+class ProviderHealth:
+    _shared = {}                  # path -> (state, lock), see shared()
+    _shared_lock = threading.Lock()
+
+    def __init__(self, path=HEALTH_PATH, settings=None):
+        self.path = path
+        self.cfg = {**DEFAULTS, **(settings or {})}
+        self._lock = threading.Lock()
+        self.state = self._load()
+
+    @classmethod
+    def shared(cls, settings=None, path=HEALTH_PATH):
+        """A view on the process-wide state for `path`; `settings` (thresholds) stay per caller."""
+        with cls._shared_lock:
+            if path not in cls._shared:
+                first = cls(path)
+                cls._shared[path] = (first.state, first._lock)
+            state, lock = cls._shared[path]
+        view = cls.__new__(cls)
+        view.path = path
+        view.cfg = {**DEFAULTS, **(settings or {})}
+        view.state, view._lock = state, lock
+        return view
+
+    # ---------- persistence ----------
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except Exception:
+            return {}
+
+    def save(self):
+        # per-writer temp file: separate instances or processes may save at once
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with self._lock:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(self.state, f, indent=2, sort_keys=True)
+                os.replace(tmp, self.path)
+        except Exception:
+            pass
+
+    def _entry(self, name):
+        return self.state.setdefault(name, {
+            "latencies": [], "outcomes": [], "consecutive_failures": 0, "open_until": 0,
+        })
+
+    # ---------- recording ----------
+
+    def record(self, name, latency_s, ok):
+        with self._lock:
+            e = self._entry(name)
+            e["latencies"] = (e["latencies"] + [round(latency_s, 3)])[-WINDOW:]
+            e["outcomes"] = (e["outcomes"] + [1 if ok else 0])[-WINDOW:]
+            if ok:
+                e["consecutive_failures"] = 0
+                e["open_until"] = 0
+            else:
+                e["consecutive_failures"] += 1
+                if e["consecutive_failures"] >= self.cfg["breaker_failures"]:
+                    e["open_until"] = time.time() + self.cfg["breaker_cooldown_minutes"] * 60
+
+    # ---------- queries ----------
+
+    def is_open(self, name):
+        """True while the breaker is open. After cooldown the provider is half-open:
+        one trial goes through and a single failure re-opens it."""
+        with self._lock:
+            e = self.state.get(name)
+            return bool(e) and time.time() < e.get("open_until", 0)
+
+    def success_rate(self, name):
+        with self._lock:
+            outs = (self.state.get(name) or {}).get("outcomes") or []
+        return sum(outs) / len(outs) if outs else 1.0
+
+    def p95_latency(self, name):
+        with self._lock:
+            lats = (self.state.get(name) or {}).get("latencies") or []
+        return _p95(lats)
+
+    def timeout_for(self, name, fallback):
+        """Adaptive per-request timeout; `fallback` is used until we have samples."""
+        p95 = self.p95_latency(name)
+        t = fallback if p95 is None else 2 * p95 + 1
+        return max(self.cfg["min_timeout_seconds"], min(self.cfg["max_timeout_seconds"], t))
+
+    def order(self, names):
+        """Drop open circuits, then sort by success rate (desc) and p95 latency (asc).
+        Ties keep the configured order."""
+        live = [n for n in names if not self.is_open(n)]
+        return sorted(live, key=lambda n: (-round(self.success_rate(n), 1), self.p95_latency(n) or 0))
+
+class Budget:
+    """Wall-clock budget shared by all providers of one fetch."""
+    MARGIN = 0.5  # less than this left counts as spent
+
+    def __init__(self, seconds):
+        self.deadline = time.monotonic() + seconds
+
+    def remaining(self):
+        return self.deadline - time.monotonic()
+
+    def exhausted(self):
+        return self.remaining() <= self.MARGIN
+
+    def timeout(self, wanted):
+        if self.exhausted():
+            raise BudgetExceeded("stock fetch budget exhausted")
+        return min(wanted, self.remaining())
@@ -0,0 +1,107 @@
+# sprites.py
+"""
+Pre-rasterized text sprites.
+
+Static strings (the signature, each style's subtitle) are shaped and drawn once
+per (text, font, size, color[, plate]) into an RGBA sprite, kept in memory and
+in .sprite_cache/ (override with SPRITE_CACHE_DIR). Stamping is then a single
+alpha composite, which also gives the signature plate real translucency —
+drawing (0,0,0,120) straight onto an RGB image ignores the alpha.
+"""
+import os, hashlib, threading
+from functools import lru_cache
+from PIL import Image, ImageDraw, ImageFont, PngImagePlugin
+
+ROOT = os.path.dirname(__file__)
+CACHE_DIR = os.environ.get("SPRITE_CACHE_DIR", os.path.join(ROOT, ".sprite_cache"))
+
+FONT_REGULAR = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+FONT_BOLD    = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"
+
+class Sprite:
+    __slots__ = ("image", "advance")
+
+    def __init__(self, image, advance):
+        self.image = image        # RGBA
+        self.advance = advance    # text advance width, for right-aligning like textlength()
+
+    @property
+    def size(self):
+        return self.image.size
+
+@lru_cache(maxsize=64)
+def font(size, bold=False):
+    try:
+        return ImageFont.truetype(FONT_BOLD if bold else FONT_REGULAR, size)
+    except Exception:
+        return ImageFont.load_default()
+
+_mem = {}
+_lock = threading.Lock()
+
+def _cached(key, build):
+    with _lock:
+        sp = _mem.get(key)
+    if sp is not None:
+        return sp
+
+    path = os.path.join(CACHE_DIR, hashlib.sha1(repr(key).encode("utf-8")).hexdigest() + ".png")
+    sp = None
+    try:
+        with Image.open(path) as im:
+            im.load()
+            sp = Sprite(im.convert("RGBA"), float(im.info["advance"]))
+    except Exception:
+        sp = build()
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            meta = PngImagePlugin.PngInfo()
+            meta.add_text("advance", repr(sp.advance))
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"  # album threads build the same sprite
+            sp.image.save(tmp, "PNG", pnginfo=meta)
+            os.replace(tmp, path)
+        except Exception:
+            pass  # disk cache is best-effort
+
+    with _lock:
+        _mem[key] = sp
+    return sp
+
+def text_sprite(text, size, color, bold=False):
+    """Text on transparent background; stamping at (x, y) matches draw.text((x, y), ...)."""
+    path = FONT_BOLD if bold else FONT_REGULAR
+    key = ("text", text, path, size, tuple(color))
+
+    def build():
+        f = font(size, bold)
+        _, _, r, b = f.getbbox(text)
+        im = Image.new("RGBA", (max(1, r), max(1, b)), (0, 0, 0, 0))
+        ImageDraw.Draw(im).text((0, 0), text, fill=tuple(color), font=f)
+        return Sprite(im, f.getlength(text))
+
+    return _cached(key, build)
+
+def plate_sprite(text, size=28, color=(255, 255, 255), plate=(0, 0, 0, 120), pad=24, height=34):
+    """
+    Text on a translucent plate, `pad` wider than the text and `height` tall.
+    Text sits pad/2 in from the left and slightly raised, as the signature always was.
+    """
+    key = ("plate", text, FONT_REGULAR, size, tuple(color), tuple(plate), pad, height)
+
+    def build():
+        f = font(size)
+        tw = f.getlength(text)
+        im = Image.new("RGBA", (int(tw + pad) + 1, height + 1), tuple(plate))
+        ImageDraw.Draw(im).text((pad * 0.5, -pad * 0.2), text, fill=tuple(color), font=f)
+        return Sprite(im, tw)
+
+    return _cached(key, build)
+
+def stamp(img, sprite, xy):
+    """Composite a sprite at integer (x, y); works on RGB (masked paste) and RGBA canvases."""
+    x, y = int(round(xy[0])), int(round(xy[1]))
+    if img.mode == "RGBA" and x >= 0 and y >= 0:
+        img.alpha_composite(sprite.image, (x, y))
+    else:
+        img.paste(sprite.image, (x, y), sprite.image)
+    return img
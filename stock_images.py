@@ -1,11 +1,18 @@
 # stock_images.py
-import os, io, random, re
+import os, io, time, random, re
 from urllib.parse import quote_plus
-import requests
-from PIL import Image
+import requests, urllib3
+import http_pool
+from PIL import Image, ImageFilter
+from tracing import span
+from provider_health import ProviderHealth, Budget, BudgetExceeded
 
 USER_AGENT = "MaromLinkedInPoster/1.0 (+github-actions)"
 
+# Base URLs (overridable to point at local fakes, see fake_services.py)
+PEXELS_API    = os.environ.get("PEXELS_API_BASE", "https://api.pexels.com")
+OPENVERSE_API = os.environ.get("OPENVERSE_API_BASE", "https://api.openverse.engineering")
+
 TOPIC_HINTS = [
     # (pattern, list of search keywords)
     (r"\bFlutter\b|\bnavigation\b|GoRouter", ["flutter ui", "mobile app interface", "developer at laptop"]),
@@ -25,67 +32,198 @@ def _pick_keywords(topic: str):
     # default fallbacks
     return ["mobile app developer", "clean minimal desk", "programmer workspace"]
 
-def _center_crop(im: Image.Image, tw: int, th: int) -> Image.Image:
-    w, h = im.size
-    scale = max(tw / w, th / h)
-    im = im.resize((int(w*scale), int(h*scale)), Image.LANCZOS)
+def _energy_profiles(im: Image.Image):
+    """Mean edge energy per column and per row of a small grayscale copy."""
+    small = im.convert("L")
+    small.thumbnail((256, 256))
+    e = small.filter(ImageFilter.FIND_EDGES)
+    cols = list(e.resize((e.width, 1), Image.BOX).getdata())
+    rows = list(e.resize((1, e.height), Image.BOX).getdata())
+    cols[0] = cols[-1] = rows[0] = rows[-1] = 0  # the filter's border pixels are not edges
+    return cols, rows
+
+def _best_window(profile, win):
+    """Start of the `win`-long window with the most energy; ties go to the most central."""
+    n = len(profile)
+    if win >= n:
+        return 0
+    cur = sum(profile[:win])
+    best, best_key = 0, None
+    for i in range(n - win + 1):
+        if i:
+            cur += profile[i + win - 1] - profile[i - 1]
+        key = (cur, -abs(2 * i + win - n))
+        if best_key is None or key > best_key:
+            best, best_key = i, key
+    return best
+
+def _smart_crop(im: Image.Image, tw: int, th: int, profiles=None) -> Image.Image:
+    """Crop to tw:th where the edges (subject) are, then resize only that box."""
     w, h = im.size
-    x = max(0, (w - tw) // 2)
-    y = max(0, (h - th) // 2)
-    return im.crop((x, y, x + tw, y + th))
+    cols, rows = profiles or _energy_profiles(im)
+    if w * th > h * tw:   # too wide: slide horizontally
+        cw, ch = h * tw / th, h
+        x = _best_window(cols, round(len(cols) * cw / w)) * w / len(cols)
+        box = (min(x, w - cw), 0, min(x, w - cw) + cw, ch)
+    else:                 # too tall: slide vertically
+        cw, ch = w, w * th / tw
+        y = _best_window(rows, round(len(rows) * ch / h)) * h / len(rows)
+        box = (0, min(y, h - ch), cw, min(y, h - ch) + ch)
+    return im.resize((tw, th), Image.LANCZOS, box=box)
+
+# 4xx that won't clear on their own (bad/revoked key, rate limit) count against
+# the provider, so the breaker stops sending every run to it first
+FAILURE_STATUSES = (401, 403, 429)
+
+_TIMEOUTS = (requests.Timeout, urllib3.exceptions.TimeoutError, TimeoutError)
+CHUNK = 64 * 1024
+
+def _read_body(r, read_timeout, budget):
+    """
+    Read a streamed body by the budget's deadline. A requests timeout only bounds each
+    socket read, so a server trickling bytes could hold us far past it: every read
+    here gets at most what's left, and whatever has arrived counts as a chunk.
+    """
+    conn = getattr(r.raw, "connection", None)
+    read = getattr(r.raw, "read1", None) or r.raw.read
+    body = []
+    try:
+        while True:
+            if budget.exhausted():
+                raise BudgetExceeded("stock fetch budget exhausted mid-download")
+            if conn is not None and conn.sock is not None:
+                conn.sock.settimeout(min(read_timeout, budget.remaining()))
+            chunk = read(CHUNK)
+            if not chunk:
+                break
+            body.append(chunk)
+        r._content, r._content_consumed = b"".join(body), True
+    finally:
+        r.close()  # back to the pool when fully read, dropped otherwise
+
+def _get(provider, url, headers, timeout, health=None, budget=None):
+    """
+    GET with an adaptive timeout; with a `budget` the whole call, body included, ends
+    by its deadline. Feeds provider health, except for timeouts the budget caused.
+    """
+    if health is not None:
+        timeout = health.timeout_for(provider, timeout)
+    t0 = time.monotonic()
+    try:
+        if budget is None:
+            r = http_pool.get(provider, url, headers=headers, timeout=timeout)
+        else:
+            r = http_pool.get(provider, url, headers=headers, timeout=budget.timeout(timeout), stream=True)
+            _read_body(r, timeout, budget)
+    except BudgetExceeded:
+        raise
+    except Exception as e:
+        if budget is not None and isinstance(e, _TIMEOUTS) and budget.exhausted():
+            # cut short by the budget, not slow by itself: no sample for the breaker
+            raise BudgetExceeded("stock fetch budget exhausted") from e
+        if health is not None:
+            health.record(provider, time.monotonic() - t0, False)
+        raise
+    if health is not None:
+        health.record(provider, time.monotonic() - t0, r.status_code < 500 and r.status_code not in FAILURE_STATUSES)
+    return r
+
+def decode_crop(content: bytes, sizes):
+    """Decode once and smart-crop to each (w, h). Returns {size: RGB image}; the
+    renderer encodes them once, after the signature. CPU-heavy: runs in the render
+    step (the shared process pool with several accounts), not in fetch_stock."""
+    with span("stock.decode_crop", bytes_in=len(content), variants=len(sizes)):
+        im = Image.open(io.BytesIO(content)).convert("RGB")
+        profiles = _energy_profiles(im)
+        return {tuple(size): _smart_crop(im, size[0], size[1], profiles) for size in sizes}
 
 # ---------- Pexels (FREE key) ----------
-def try_pexels(topic: str, out_path: str, target_size=(1600,900)) -> bool:
+def try_pexels(topic: str, health=None, budget=None):
     api_key = os.environ.get("PEXELS_API_KEY")
     if not api_key:
-        return False
+        return None
     query = random.choice(_pick_keywords(topic))
-    url = f"https://api.pexels.com/v1/search?query={quote_plus(query)}&per_page=40&orientation=landscape"
-    r = requests.get(url, headers={"Authorization": api_key, "User-Agent": USER_AGENT}, timeout=25)
+    url = f"{PEXELS_API}/v1/search?query={quote_plus(query)}&per_page=40&orientation=landscape"
+    with span("stock.pexels.search", query=query) as sp:
+        r = _get("pexels", url, {"Authorization": api_key, "User-Agent": USER_AGENT}, 25, health, budget)
+        sp.http(r)
     if r.status_code != 200:
-        return False
+        return None
     data = r.json()
     photos = data.get("photos", [])
     if not photos:
-        return False
+        return None
     pick = random.choice(photos)
     src = pick.get("src", {}).get("large") or pick.get("src", {}).get("original")
     if not src:
-        return False
-    img_r = requests.get(src, headers={"User-Agent": USER_AGENT}, timeout=25)
+        return None
+    with span("stock.pexels.download") as sp:
+        img_r = _get("pexels", src, {"User-Agent": USER_AGENT}, 25, health, budget)
+        sp.http(img_r)
     img_r.raise_for_status()
-    im = Image.open(io.BytesIO(img_r.content)).convert("RGB")
-    im = _center_crop(im, target_size[0], target_size[1])
-    im.save(out_path, quality=95, subsampling=0)
-    return True
+    return img_r.content
 
 # ---------- Openverse (NO key) ----------
-def try_openverse(topic: str, out_path: str, target_size=(1600,900)) -> bool:
+def try_openverse(topic: str, health=None, budget=None):
     query = random.choice(_pick_keywords(topic))
     url = (
-        "https://api.openverse.engineering/v1/images/"
+        f"{OPENVERSE_API}/v1/images/"
         f"?q={quote_plus(query)}&license_type=commercial&extensions=jpg&size=large&field_set=ids"
     )
-    r = requests.get(url, headers={"User-Agent": USER_AGENT}, timeout=25)
+    with span("stock.openverse.search", query=query) as sp:
+        r = _get("openverse", url, {"User-Agent": USER_AGENT}, 25, health, budget)
+        sp.http(r)
     if r.status_code != 200:
-        return False
+        return None
     data = r.json()
     results = data.get("results", [])
     if not results:
-        return False
+        return None
     # fetch details to get URL
     pick = random.choice(results)
-    detail_url = f"https://api.openverse.engineering/v1/images/{pick['id']}/"
-    dr = requests.get(detail_url, headers={"User-Agent": USER_AGENT}, timeout=25)
+    detail_url = f"{OPENVERSE_API}/v1/images/{pick['id']}/"
+    with span("stock.openverse.detail") as sp:
+        dr = _get("openverse", detail_url, {"User-Agent": USER_AGENT}, 25, health, budget)
+        sp.http(dr)
     if dr.status_code != 200:
-        return False
+        return None
     src = dr.json().get("url")
     if not src:
-        return False
-    img_r = requests.get(src, headers={"User-Agent": USER_AGENT}, timeout=30)
+        return None
+    with span("stock.openverse.download") as sp:
+        img_r = _get("openverse", src, {"User-Agent": USER_AGENT}, 30, health, budget)
+        sp.http(img_r)
     if img_r.status_code != 200:
-        return False
-    im = Image.open(io.BytesIO(img_r.content)).convert("RGB")
-    im = _center_crop(im, target_size[0], target_size[1])
-    im.save(out_path, quality=95, subsampling=0)
-    return True
+        return None
+    return img_r.content
+
+# ---------- Provider selection ----------
+PROVIDERS = {
+    "pexels":    try_pexels,
+    "openverse": try_openverse,
+}
+
+def fetch_stock(topic: str, settings=None):
+    """
+    Try providers healthiest-first, skipping open circuits, within one total time budget.
+    Returns (provider name, downloaded image bytes) for decode_crop(), or (None, None)
+    → procedural fallback.
+    """
+    health = ProviderHealth.shared(settings)
+    budget = Budget(health.cfg["budget_seconds"])
+    names = health.order(list(PROVIDERS))
+    try:
+        for name in names:
+            with span(f"stock.{name}", timeout=round(health.timeout_for(name, 25), 2)) as sp:
+                try:
+                    photo = PROVIDERS[name](topic, health=health, budget=budget)
+                    if photo:
+                        return name, photo
+                except BudgetExceeded:
+                    sp.set(budget_exceeded=True)
+                    return None, None
+                except Exception as e:
+                    sp.set(error=f"{e.__class__.__name__}: {e}")
+        return None, None
+    finally:
+        health.save()
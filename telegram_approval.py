@@ -1,12 +1,25 @@
-import os, time, requests, json
+import os, io, time, json, queue, threading
+from PIL import Image
+import http_pool
+from tracing import span
 
-BOT_TOKEN = os.environ["TELEGRAM_BOT_TOKEN"]
-CHAT_ID   = os.environ["TELEGRAM_CHAT_ID"]
+# Defaults for the single-account flow; multi-account callers pass bot={"token","chat_id"}
+BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN")
+CHAT_ID   = os.environ.get("TELEGRAM_CHAT_ID")
 
-API = f"https://api.telegram.org/bot{BOT_TOKEN}"
+API_BASE = os.environ.get("TELEGRAM_API_BASE", "https://api.telegram.org")
+API = f"{API_BASE}/bot{BOT_TOKEN}"
+
+def _target(bot=None):
+    """(api_url, chat_id) for an explicit bot dict, else the env defaults."""
+    if not bot:
+        if not (BOT_TOKEN and CHAT_ID):
+            raise RuntimeError("TELEGRAM_BOT_TOKEN / TELEGRAM_CHAT_ID are not set.")
+        return API, CHAT_ID
+    return f"{API_BASE}/bot{bot['token']}", str(bot["chat_id"])
 
 def _post(method: str, **data):
-    r = requests.post(f"{API}/{method}", data=data, timeout=60)
+    r = http_pool.post("telegram", f"{API}/{method}", data=data, timeout=60)
     try:
         jr = r.json()
     except Exception:
@@ -16,7 +29,8 @@ def _post(method: str, **data):
         raise RuntimeError(f"Telegram error on {method}: {jr}")
     return jr
 
-def send_preview(image_path, text, approval_code):
+def send_preview(image_path, text, approval_code, bot=None):
+    api, chat_id = _target(bot)
     caption = (
         "Preview for LinkedIn post\n"
         f"Approval code: {approval_code}\n\n"
@@ -39,32 +53,169 @@ def send_preview(image_path, text, approval_code):
         ]
     }
 
-    with open(image_path, "rb") as f:
-        r = requests.post(
-            f"{API}/sendPhoto",
-            data={"chat_id": CHAT_ID, "caption": caption, "reply_markup": json.dumps(kb)},
+    with span("telegram.send_preview", bytes_out=os.path.getsize(image_path)) as sp, open(image_path, "rb") as f:
+        r = http_pool.post(
+            "telegram",
+            f"{api}/sendPhoto",
+            data={"chat_id": chat_id, "caption": caption, "reply_markup": json.dumps(kb)},
             files={"photo": f},
             timeout=60,
         )
+        sp.http(r)
     jr = r.json()
     if not jr.get("ok", False):
         raise RuntimeError(f"Telegram sendPhoto failed: {jr}")
     return True
 
-def _ack_callback(callback_id, text="Got it"):
+def _compact_jpeg(image_path, max_side=960, quality=80):
+    """Small preview bytes; JPEG draft mode decodes straight at a reduced scale."""
+    with Image.open(image_path) as im:
+        im.draft("RGB", (max_side, max_side))
+        im = im.convert("RGB")
+        im.thumbnail((max_side, max_side))
+        buf = io.BytesIO()
+        im.save(buf, "JPEG", quality=quality, optimize=True)
+    return buf.getvalue()
+
+def send_album(candidates, approval_code, bot=None):
+    """
+    Candidates (build() metas) as one media group of compact previews, then one
+    message with the keyboard — media groups can't carry buttons. Button k sends
+    APPROVE:<code>:<k>. Telegram takes 2–10 photos per group.
+    """
+    api, chat_id = _target(bot)
+    media, files = [], {}
+    for k, meta in enumerate(candidates, 1):
+        files[f"c{k}"] = (f"c{k}.jpg", _compact_jpeg(meta["image"]), "image/jpeg")
+        media.append({
+            "type": "photo",
+            "media": f"attach://c{k}",
+            "caption": f"#{k} · {meta.get('style', '')}\n\n{meta['text']}"[:1024],
+        })
+
+    size = sum(len(f[1]) for f in files.values())
+    with span("telegram.send_album", candidates=len(candidates), bytes_out=size) as sp:
+        r = http_pool.post(
+            "telegram",
+            f"{api}/sendMediaGroup",
+            data={"chat_id": chat_id, "media": json.dumps(media)},
+            files=files,
+            timeout=60,
+        )
+        sp.http(r)
+    jr = r.json()
+    if not jr.get("ok", False):
+        raise RuntimeError(f"Telegram sendMediaGroup failed: {jr}")
+
+    picks = [{"text": f"✅ {k}", "callback_data": f"APPROVE:{approval_code}:{k}"}
+             for k in range(1, len(candidates) + 1)]
+    kb = {
+        "inline_keyboard": [picks[i:i+5] for i in range(0, len(picks), 5)] + [[
+            {"text": "❌ Skip all",      "callback_data": f"SKIP:{approval_code}"},
+            {"text": "🔁 Another set",   "callback_data": f"ANOTHER:{approval_code}"},
+        ]]
+    }
+    text = (
+        f"Album preview: {len(candidates)} candidates for LinkedIn\n"
+        f"Approval code: {approval_code}\n\n"
+        "Choose:\n"
+        f"  ✅ 1–{len(candidates)} approve that one\n"
+        "  ❌ Skip all\n"
+        "  🔁 Another set"
+    )
+    with span("telegram.send_keyboard") as sp:
+        r = http_pool.post(
+            "telegram",
+            f"{api}/sendMessage",
+            data={"chat_id": chat_id, "text": text, "reply_markup": json.dumps(kb)},
+            timeout=60,
+        )
+        sp.http(r)
+    jr = r.json()
+    if not jr.get("ok", False):
+        raise RuntimeError(f"Telegram sendMessage failed: {jr}")
+    return True
+
+def _ack_callback(callback_id, text="Got it", api=None):
     try:
-        requests.post(f"{API}/answerCallbackQuery", data={"callback_query_id": callback_id, "text": text}, timeout=20)
+        http_pool.post("telegram", f"{api or API}/answerCallbackQuery",
+                       data={"callback_query_id": callback_id, "text": text}, timeout=20)
     except Exception:
         pass
 
-def wait_for_approval(approval_code, timeout_minutes):
+# action -> (decision returned to the caller, callback ack text)
+DECISIONS = {
+    "APPROVE": (True,      "Approved ✅"),
+    "SKIP":    (False,     "Skipped ❌"),
+    "ANOTHER": ("ANOTHER", "Generating another 🔁"),
+}
+
+def _pick(s):
+    return int(s) if s.isdigit() else None
+
+def _parse_update(upd):
+    """
+    Returns (action, code, pick, chat_id, callback_id) for a button tap or an
+    "APPROVE <code> [k]" / "SKIP <code>" text command, else None. `pick` is the
+    album candidate number (1-based) or None.
+    """
+    cb = upd.get("callback_query")
+    if cb:
+        action, _, rest = (cb.get("data") or "").upper().partition(":")
+        code, _, pick = rest.partition(":")
+        chat = ((cb.get("message") or {}).get("chat") or {}).get("id")
+        return action, code, _pick(pick), str(chat), cb.get("id")
+
+    msg = upd.get("message") or upd.get("edited_message")
+    if not msg:
+        return None
+    action, code, pick = ((msg.get("text") or "").strip().upper().split() + ["", ""])[:3]
+    if action not in ("APPROVE", "SKIP"):
+        return None
+    return action, code, _pick(pick), str((msg.get("chat") or {}).get("id")), None
+
+def _decide(action, pick, choices=1):
+    """
+    (decision, ack) for a parsed tap, or None if it isn't a valid answer. With
+    several candidates APPROVE must name one: a bare APPROVE never means #1.
+    """
+    if action not in DECISIONS:
+        return None
+    if action == "APPROVE" and (pick is not None or choices > 1):
+        if pick is None or not 1 <= pick <= choices:
+            return None
+        return pick - 1, f"Approved #{pick} ✅"
+    return DECISIONS[action]
+
+def _ask_for_pick(code, choices, chat_id, cb_id=None, api=None):
+    """Answer an APPROVE that didn't name a valid candidate."""
+    if cb_id:
+        _ack_callback(cb_id, f"Pick one: tap ✅ 1–{choices}", api)
+        return
+    try:
+        http_pool.post("telegram", f"{api or API}/sendMessage", timeout=20, data={
+            "chat_id": chat_id,
+            "text": f"Which candidate? Reply APPROVE {code} <1–{choices}> or tap ✅ 1–{choices}.",
+        })
+    except Exception:
+        pass
+
+def wait_for_approval(approval_code, timeout_minutes, bot=None, choices=1):
     """
     Returns:
       True      -> approved
+      k (int)   -> album candidate k approved (0-based; `choices` candidates were sent)
       False     -> skipped
       "ANOTHER" -> user asked for another idea
       None      -> timeout
+
+    With bot=..., waits through the shared ApprovalHub for that bot token, so
+    several accounts can wait on one bot concurrently.
     """
+    if bot:
+        api, chat_id = _target(bot)
+        return ApprovalHub.for_bot(api).wait(approval_code, chat_id, timeout_minutes * 60, choices)
+
     deadline = time.time() + timeout_minutes * 60
     offset = None
     code_upper = str(approval_code).upper()
@@ -72,45 +223,135 @@ def wait_for_approval(approval_code, timeout_minutes):
     while time.time() < deadline:
         params = {"timeout": 20}
         if offset: params["offset"] = offset
-        r = requests.get(f"{API}/getUpdates", params=params, timeout=40)
-        jr = r.json()
+        with span("telegram.get_updates") as sp:
+            r = http_pool.get("telegram", f"{API}/getUpdates", params=params, timeout=40)
+            sp.http(r)
+            jr = r.json()
+            if not jr.get("ok", False):
+                sp.add("retries")
         if not jr.get("ok", False):
             time.sleep(2); continue
 
         for upd in jr.get("result", []):
             offset = upd["update_id"] + 1
-
-            # callback buttons
-            cb = upd.get("callback_query")
-            if cb:
-                data = (cb.get("data") or "").upper()
-                msg  = cb.get("message", {})
-                chat = (msg.get("chat") or {}).get("id")
-                if str(chat) != str(CHAT_ID):
-                    _ack_callback(cb.get("id"), "Not your chat")
-                    continue
-                if data == f"APPROVE:{code_upper}":
-                    _ack_callback(cb.get("id"), "Approved ✅")
-                    return True
-                if data == f"SKIP:{code_upper}":
-                    _ack_callback(cb.get("id"), "Skipped ❌")
-                    return False
-                if data == f"ANOTHER:{code_upper}":
-                    _ack_callback(cb.get("id"), "Generating another 🔁")
-                    return "ANOTHER"
-
-            # fallback text commands
-            msg = upd.get("message") or upd.get("edited_message")
-            if not msg:
+            parsed = _parse_update(upd)
+            if not parsed:
+                continue
+            action, code, pick, chat, cb_id = parsed
+            if chat != str(CHAT_ID):
+                if cb_id: _ack_callback(cb_id, "Not your chat")
                 continue
-            if str((msg.get("chat") or {}).get("id")) != str(CHAT_ID):
+            if code != code_upper:
                 continue
-            txt = (msg.get("text") or "").strip().upper()
-            if txt == f"APPROVE {code_upper}":
-                return True
-            if txt == f"SKIP {code_upper}":
-                return False
+            decided = _decide(action, pick, choices)
+            if decided:
+                decision, ack = decided
+                if cb_id: _ack_callback(cb_id, ack)
+                return decision
+            if action == "APPROVE":
+                _ask_for_pick(code, choices, chat, cb_id)
 
         time.sleep(2)
 
     return None
+
+class ApprovalHub:
+    """
+    One getUpdates poller per bot, fanning decisions out to waiters by approval code.
+    Accounts sharing a bot never consume each other's updates, and a slow approval
+    only blocks its own waiter. The poller thread exits when nobody is waiting.
+    """
+    _hubs = {}
+    _hubs_lock = threading.Lock()
+
+    @classmethod
+    def for_bot(cls, api):
+        with cls._hubs_lock:
+            hub = cls._hubs.get(api)
+            if hub is None:
+                hub = cls._hubs[api] = cls(api)
+            return hub
+
+    UNCLAIMED_TTL = 600  # keep taps that arrive before their waiter registers
+
+    def __init__(self, api):
+        self.api = api
+        self.waiters = {}   # code -> (chat_id, choices, Queue)
+        self.unclaimed = {} # code -> (received_at, update)
+        self.offset = None
+        self.lock = threading.Lock()
+        self.thread = None
+        self.retries = 0    # failed getUpdates calls (each one slept and retried)
+
+    def wait(self, approval_code, chat_id, timeout_s, choices=1):
+        code = str(approval_code).upper()
+        q = queue.Queue(maxsize=1)
+        with self.lock:
+            self.waiters[code] = (str(chat_id), choices, q)
+            early = self.unclaimed.pop(code, None)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._loop, name="tg-approval-hub", daemon=True)
+                self.thread.start()
+        if early:
+            self._dispatch(early[1])
+        retries0 = self.retries
+        try:
+            with span("telegram.hub_wait") as sp:
+                try:
+                    return q.get(timeout=timeout_s)
+                finally:
+                    # getUpdates retries the shared poller made while this waiter was queued
+                    sp.set(retries=self.retries - retries0)
+        except queue.Empty:
+            return None
+        finally:
+            with self.lock:
+                self.waiters.pop(code, None)
+
+    def _loop(self):
+        while True:
+            with self.lock:
+                if not self.waiters:
+                    self.thread = None
+                    return
+            params = {"timeout": 20}
+            if self.offset: params["offset"] = self.offset
+            try:
+                r = http_pool.get("telegram", f"{self.api}/getUpdates", params=params, timeout=40)
+                jr = r.json()
+            except Exception:
+                self.retries += 1
+                time.sleep(2); continue
+            if not jr.get("ok", False):
+                self.retries += 1
+                time.sleep(2); continue
+            for upd in jr.get("result", []):
+                self.offset = upd["update_id"] + 1
+                self._dispatch(upd)
+
+    def _dispatch(self, upd):
+        parsed = _parse_update(upd)
+        if not parsed:
+            return
+        action, code, pick, chat, cb_id = parsed
+        with self.lock:
+            waiter = self.waiters.get(code)
+            if waiter is None:
+                now = time.time()
+                self.unclaimed = {c: v for c, v in self.unclaimed.items() if now - v[0] < self.UNCLAIMED_TTL}
+                self.unclaimed[code] = (now, upd)
+                return
+        chat_id, choices, q = waiter
+        if chat != chat_id:
+            if cb_id: _ack_callback(cb_id, "Not your chat", self.api)
+            return
+        decided = _decide(action, pick, choices)
+        if decided:
+            decision, ack = decided
+            if cb_id: _ack_callback(cb_id, ack, self.api)
+            try:
+                q.put_nowait(decision)
+            except queue.Full:
+                pass
+        elif action == "APPROVE":
+            _ask_for_pick(code, choices, chat, cb_id, self.api)
@@ -0,0 +1,276 @@
+# tracing.py
+"""
+Lightweight per-stage tracing for the post pipeline.
+
+Enable with TRACE=1. Each run_once() appends one JSON line to traces.jsonl
+(override with TRACE_PATH) holding every span of that run:
+name, parent, start/duration in ms and free-form attrs (bytes, status, retries...).
+
+    python tracing.py summarize [path]   -> p50/p95 per stage across runs
+
+TRACE_PROFILE=<stage>      cProfile that stage, print top functions to stderr
+TRACE_PROFILE=<stage>:mem  tracemalloc that stage, record peak bytes on the span
+
+When disabled, span() hands back a shared no-op object, so the cost is one
+function call + attribute check per stage.
+"""
+import os, sys, json, time, uuid, threading, datetime
+
+ROOT = os.path.dirname(__file__)
+TRACE_ENABLED = os.environ.get("TRACE") == "1"
+TRACE_PATH = os.environ.get("TRACE_PATH", os.path.join(ROOT, "traces.jsonl"))
+TRACE_PROFILE = os.environ.get("TRACE_PROFILE", "")
+
+_local = threading.local()
+_lock = threading.Lock()
+
+# ----------------------------- spans ------------------------------------------
+
+class _NullSpan:
+    """Returned when tracing is off (or no run is active). Every method is a no-op."""
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+    def set(self, **attrs): return self
+    def add(self, key, n=1): return self
+    def http(self, resp): return self
+
+NULL_SPAN = _NullSpan()
+
+class Span:
+    def __init__(self, run, name, parent, attrs):
+        self.run = run
+        self.name = name
+        self.parent = parent
+        self.attrs = dict(attrs)
+        self.start = 0.0
+        self.end = 0.0
+        self._prof = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        return self
+
+    def add(self, key, n=1):
+        self.attrs[key] = self.attrs.get(key, 0) + n
+        return self
+
+    def http(self, resp):
+        """Record status code and payload size of a requests.Response."""
+        try:
+            self.attrs["status"] = resp.status_code
+            self.add("bytes_in", len(resp.content or b""))
+        except Exception:
+            pass
+        return self
+
+    def __enter__(self):
+        _stack().append(self)
+        self._prof = _start_profile(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.perf_counter()
+        if self._prof is not None:
+            _stop_profile(self, self._prof)
+        if exc_type is not None:
+            self.attrs["error"] = f"{exc_type.__name__}: {exc}"
+        st = _stack()
+        if st and st[-1] is self:
+            st.pop()
+        self.run._finish(self)
+        return False
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "parent": self.parent,
+            "start_ms": round((self.start - self.run.start) * 1000, 3),
+            "dur_ms": round((self.end - self.start) * 1000, 3),
+            "attrs": self.attrs,
+        }
+
+class Run(Span):
+    """Root span; collects finished child spans and writes one JSONL record on exit."""
+    def __init__(self, name, attrs):
+        self.spans = []
+        self.run_id = uuid.uuid4().hex[:12]
+        self.started_at = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        super().__init__(self, name, None, attrs)
+
+    def _finish(self, span):
+        if span is self:
+            _write(self)
+        else:
+            with _lock:
+                self.spans.append(span)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        _local.run = self
+        _local.stack = [self]
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.perf_counter()
+        if exc_type is not None:
+            self.attrs["error"] = f"{exc_type.__name__}: {exc}"
+        _local.run = None
+        _local.stack = []
+        self._finish(self)
+        return False
+
+    def record(self):
+        return {
+            "run_id": self.run_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "dur_ms": round((self.end - self.start) * 1000, 3),
+            "attrs": self.attrs,
+            "spans": [s.as_dict() for s in sorted(self.spans, key=lambda s: s.start)],
+        }
+
+def _stack():
+    st = getattr(_local, "stack", None)
+    if st is None:
+        st = _local.stack = []
+    return st
+
+def current_run():
+    return getattr(_local, "run", None)
+
+def start_run(name="run", **attrs):
+    """Root context for one pipeline run; a no-op unless TRACE=1."""
+    if not TRACE_ENABLED:
+        return NULL_SPAN
+    return Run(name, attrs)
+
+def span(name, **attrs):
+    """Nested stage span. Outside of an active run (or when disabled) returns NULL_SPAN."""
+    if not TRACE_ENABLED:
+        return NULL_SPAN
+    run = current_run()
+    if run is None:
+        return NULL_SPAN
+    st = _stack()
+    parent = st[-1].name if st else run.name
+    return Span(run, name, parent, attrs)
+
+def attach(run):
+    """Adopt a run in another thread so spans opened there land in the same record."""
+    if isinstance(run, Run):
+        _local.run = run
+        _local.stack = [run]
+
+def _write(run):
+    try:
+        with _lock, open(TRACE_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(run.record(), ensure_ascii=False) + "\n")
+    except Exception as e:
+        print(f"[trace] could not write {TRACE_PATH}: {e}", file=sys.stderr)
+
+# ----------------------------- profiling hook ---------------------------------
+
+def _start_profile(name):
+    if not TRACE_PROFILE:
+        return None
+    stage, _, mode = TRACE_PROFILE.partition(":")
+    if stage != name:
+        return None
+    if mode == "mem":
+        import tracemalloc
+        tracemalloc.start()
+        return ("mem", tracemalloc)
+    import cProfile
+    prof = cProfile.Profile()
+    prof.enable()
+    return ("cpu", prof)
+
+def _stop_profile(span_obj, handle):
+    kind, obj = handle
+    if kind == "mem":
+        _, peak = obj.get_traced_memory()
+        obj.stop()
+        span_obj.attrs["peak_alloc_bytes"] = peak
+        return
+    import pstats, io
+    obj.disable()
+    buf = io.StringIO()
+    pstats.Stats(obj, stream=buf).sort_stats("cumulative").print_stats(25)
+    print(f"[trace] cProfile for stage '{span_obj.name}':\n{buf.getvalue()}", file=sys.stderr)
+
+# ----------------------------- summarize --------------------------------------
+
+def _percentile(sorted_vals, q):
+    if not sorted_vals:
+        return 0.0
+    k = (len(sorted_vals) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (k - lo)
+
+def load_records(path=TRACE_PATH):
+    recs = []
+    if not os.path.exists(path):
+        return recs
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                recs.append(json.loads(line))
+            except ValueError:
+                continue
+    return recs
+
+def _failed(attrs):
+    """A span failed if it raised or recorded an HTTP error status."""
+    status = attrs.get("status")
+    return "error" in attrs or (isinstance(status, int) and status >= 400)
+
+def stage_stats(records):
+    """{stage: {"n","p50","p95","max","errors","retries"}} over all runs (durations in ms)."""
+    by_stage = {}
+    errors = {}
+    retries = {}
+    for rec in records:
+        by_stage.setdefault(rec.get("name", "run"), []).append(rec.get("dur_ms", 0.0))
+        for s in rec.get("spans", []):
+            attrs = s.get("attrs") or {}
+            by_stage.setdefault(s["name"], []).append(s.get("dur_ms", 0.0))
+            if _failed(attrs):
+                errors[s["name"]] = errors.get(s["name"], 0) + 1
+            if attrs.get("retries"):
+                retries[s["name"]] = retries.get(s["name"], 0) + attrs["retries"]
+    out = {}
+    for name, vals in by_stage.items():
+        vals.sort()
+        out[name] = {
+            "n": len(vals),
+            "p50": _percentile(vals, 0.50),
+            "p95": _percentile(vals, 0.95),
+            "max": vals[-1],
+            "errors": errors.get(name, 0),
+            "retries": retries.get(name, 0),
+        }
+    return out
+
+def summarize(path=TRACE_PATH, out=sys.stdout):
+    records = load_records(path)
+    if not records:
+        print(f"No trace records in {path}", file=out)
+        return 1
+    stats = stage_stats(records)
+    print(f"{len(records)} run(s) from {path}\n", file=out)
+    print(f"{'stage':<32}{'n':>6}{'p50 ms':>12}{'p95 ms':>12}{'max ms':>12}{'err':>6}{'retry':>7}", file=out)
+    for name, st in sorted(stats.items(), key=lambda kv: -kv[1]["p95"]):
+        print(f"{name:<32}{st['n']:>6}{st['p50']:>12.1f}{st['p95']:>12.1f}{st['max']:>12.1f}{st['errors']:>6}{st['retries']:>7}", file=out)
+    return 0
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if not args or args[0] != "summarize":
+        print("usage: python tracing.py summarize [traces.jsonl]")
+        sys.exit(2)
+    sys.exit(summarize(args[1] if len(args) > 1 else TRACE_PATH))